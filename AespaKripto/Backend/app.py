@@ -1,105 +1,234 @@
-from flask import Flask, render_template, request, jsonify, send_file
 import os
-import tempfile
-import base64
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from ecc_crypto import generate_ecc_keypair, encrypt_ecc, decrypt_ecc
-from audio_stego import embed_data_in_audio, extract_data_from_audio
+from flask import Flask, Blueprint, Response, current_app, render_template, request, jsonify, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
 
-app = Flask(__name__, template_folder="../templates")
+from ecc_crypto import KEYGEN_BATCH
+from uploads import (UploadError, ChunkWriter, receive_upload, create_upload, upload_status, MAX_UPLOAD_BYTES,
+                     CHUNK_SIZE)
+import store
+from service import (MAX_KEYGEN_COUNT, MAX_BULK_LICENSES, LICENSE_BATCH, SIGNATURE_WINDOW, embed_preflight,
+                     verify_preflight, keypair, keypair_lines, make_license, make_licenses, claim_embed_upload,
+                     embed_file, verify_file, verify_upload, check_signatures)
 
+VERIFY_THREADS = 4  # Files of one /verify_licenses request checked in parallel
 
-@app.route("/")
+bp = Blueprint("license", __name__)
+
+
+def create_app(config=None):
+    """Build the Flask application"""
+    app = Flask(__name__, template_folder="../templates")
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+    if config:
+        app.config.update(config)
+    app.register_blueprint(bp)
+    app.register_error_handler(RequestEntityTooLarge, upload_too_large)
+    return app
+
+
+def upload_too_large(error):
+    limit = current_app.config["MAX_CONTENT_LENGTH"]
+    return jsonify({"error": f"Upload exceeds the {limit // (1024 * 1024)} MB limit"}), 413
+
+
+@bp.route("/")
 def index():
     return render_template("index.html")
 
 
-@app.route("/generate_keys", methods=["GET"])
+@bp.route("/generate_keys", methods=["GET"])
 def generate_keys():
-    private_key, public_key = generate_ecc_keypair()
-    return jsonify({
-        "private_key": private_key,
-        "public_key": public_key
-    })
+    count = request.args.get("count", type=int)
+    if count is None:
+        return jsonify(keypair())
 
+    if not 1 <= count <= MAX_KEYGEN_COUNT:
+        return jsonify({"error": f"count must be between 1 and {MAX_KEYGEN_COUNT}"}), 400
 
-@app.route("/generate_license", methods=["POST"])
-def generate_license():
-    data = request.json
-    customer_info = {
-        "name": data["name"],
-        "email": data["email"]
-    }
-    private_key = data["private_key"]
-    validity_days = data.get("days", 365)
+    # Stream the pairs as JSON lines while they are generated
+    def stream():
+        for start in range(0, count, KEYGEN_BATCH):
+            yield keypair_lines(min(KEYGEN_BATCH, count - start))
 
-    from datetime import datetime, timedelta
-    from hashlib import sha256
-    import secrets
+    return Response(stream(), mimetype="application/x-ndjson")
 
-    issue_date = datetime.now()
-    expiry_date = issue_date + timedelta(days=int(validity_days))
 
-    license_data = {
-        "customer": customer_info,
-        "issue_date": issue_date.strftime("%Y-%m-%d"),
-        "expiry_date": expiry_date.strftime("%Y-%m-%d"),
-        "license_id": secrets.token_hex(8),
-        "type": "standard",
-        "features": data.get("features", []),
-    }
+@bp.route("/generate_license", methods=["POST"])
+def generate_license():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON license request"}), 400
 
-    json_data = json.dumps(license_data, indent=2)
-    license_hash = sha256(json_data.encode()).hexdigest()
-    license_data["hash"] = license_hash
+    try:
+        return jsonify({"license": make_license(data)})
+    except KeyError as e:
+        return jsonify({"error": f"Invalid request: missing {e}"}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request: {e}"}), 400
 
-    encrypted = encrypt_ecc(json.dumps(license_data), private_key)
-    encoded = base64.b64encode(encrypted).decode()
 
-    return jsonify({"license": encoded})
+@bp.route("/generate_licenses", methods=["POST"])
+def generate_licenses():
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BULK_LICENSES:
+        return jsonify({"error": f"Expected a JSON array of 1 to {MAX_BULK_LICENSES} license requests"}), 400
 
+    # Stream one JSON line per license, a batch at a time
+    def stream():
+        for start in range(0, len(items), LICENSE_BATCH):
+            results = make_licenses(items[start:start + LICENSE_BATCH], start)
+            yield "".join(json.dumps(result) + "\n" for result in results)
 
-@app.route("/embed_audio", methods=["POST"])
+    return Response(stream(), mimetype="application/x-ndjson")
+
+
+@bp.route("/embed_audio", methods=["POST"])
 def embed_audio():
-    license_data = request.form.get("license")
-    audio_file = request.files["audio"]
+    try:
+        fields, input_path = receive_upload(request, "audio", embed_preflight)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    try:
+        license_data = fields.get("license")
+        if not license_data:
+            return jsonify({"error": "Missing license"}), 400
+
+        key = embed_file(license_data, input_path)
+    finally:
+        os.unlink(input_path)
+
+    if not key:
+        return jsonify({"error": "Failed to embed license"}), 500
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_input:
-        audio_file.save(temp_input.name)
+    return send_output(key)
 
-    output_path = temp_input.name.replace(".wav", "_stego.wav")
 
-    success = embed_data_in_audio(license_data, temp_input.name, output_path)
+@bp.route("/uploads", methods=["POST"])
+def start_upload():
+    """Start a resumable upload: {"size": bytes} -> {"upload_id", "offset", "size"}"""
+    try:
+        return jsonify(create_upload((request.get_json(silent=True) or {}).get("size"))), 201
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+
+@bp.route("/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    """Status of a resumable upload, to resume from its offset"""
+    try:
+        return jsonify(upload_status(upload_id))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+
+@bp.route("/uploads/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id):
+    """Append the request body at the Upload-Offset header's position"""
+    try:
+        writer = ChunkWriter(upload_id, request.headers.get("Upload-Offset", type=int))
+        try:
+            stream = request.stream
+            while chunk := stream.read(CHUNK_SIZE):
+                writer.feed(chunk)
+        finally:
+            status = writer.close()
+        return jsonify(status)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+
+@bp.route("/uploads/<upload_id>/embed", methods=["POST"])
+def embed_upload(upload_id):
+    """Embed {"license": ...} into a finished resumable upload"""
+    license_data = (request.get_json(silent=True) or {}).get("license")
+    if not license_data:
+        return jsonify({"error": "Missing license"}), 400
+
+    try:
+        input_path = claim_embed_upload(upload_id, license_data)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
 
-    if not success:
+    try:
+        key = embed_file(license_data, input_path)
+    finally:
+        os.unlink(input_path)
+    if not key:
         return jsonify({"error": "Failed to embed license"}), 500
 
-    return send_file(output_path, as_attachment=True, download_name="stego_output.wav")
+    return send_output(key)
 
 
-@app.route("/verify_license", methods=["POST"])
-def verify_license():
-    audio_file = request.files["audio"]
-    public_key = request.form.get("public_key")
+@bp.route("/outputs/<key>", methods=["GET"])
+def download_output(key):
+    """Download (or resume downloading) a stored stego output"""
+    if not store.lookup(key):
+        return jsonify({"error": "Output not found"}), 404
+    return send_output(key)
+
+
+def send_output(key):
+    """
+    Send a stored output with its key as ETag
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-        audio_file.save(temp_audio.name)
+    send_file answers If-None-Match with 304 and Range with 206 on GET, and
+    hands the file to the server's zero-copy file wrapper. It opens the file
+    before returning, so an output evicted before that is a 404.
+    """
+    try:
+        response = send_file(store.output_path(key), as_attachment=True, download_name="stego_output.wav",
+                             etag=key, conditional=True)
+    except FileNotFoundError:
+        return jsonify({"error": "Output not found"}), 404
+    response.headers["Content-Location"] = f"/outputs/{key}"
+    return response
 
-    extracted = extract_data_from_audio(temp_audio.name)
-    if not extracted:
-        return jsonify({"error": "Failed to extract data"}), 400
 
+@bp.route("/verify_license", methods=["POST"])
+def verify_license():
     try:
-        encrypted = base64.b64decode(extracted)
-        decrypted_json = decrypt_ecc(encrypted, public_key)
-        data = json.loads(decrypted_json)
+        fields, audio_path = receive_upload(request, "audio", verify_preflight)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
 
-        return jsonify({"license": data})
+    body, status = verify_file(audio_path, fields.get("public_key"), bool(fields.get("prefix")))
+    return jsonify(body), status
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+
+@bp.route("/verify_licenses", methods=["POST"])
+def verify_licenses():
+    try:
+        fields, entries = receive_upload(request, "audio", verify_preflight, multiple=True)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    public_key = fields.get("public_key")
+
+    # Stream one JSON line per file as it is finished. Failures go out as
+    # soon as they are known; the signatures of the opened licenses are
+    # batch-checked a window at a time, and each window goes out after its check.
+    def stream():
+        pending = []
+        with ThreadPoolExecutor(VERIFY_THREADS) as pool:
+            futures = [pool.submit(verify_upload, i, entry, public_key) for i, entry in enumerate(entries)]
+            for future in as_completed(futures):
+                result, signed = future.result()
+                if signed is None:
+                    yield json.dumps(result) + "\n"
+                    continue
+                pending.append((result, signed))
+                if len(pending) == SIGNATURE_WINDOW:
+                    yield "".join(json.dumps(result) + "\n" for result in check_signatures(pending, public_key))
+                    pending = []
+        if pending:
+            yield "".join(json.dumps(result) + "\n" for result in check_signatures(pending, public_key))
+
+    return Response(stream(), mimetype="application/x-ndjson")
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,447 @@
+"""
+ASGI variant of the license web service
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+Serves the same routes as app.py. Request bodies are read without blocking a
+thread per upload (only their disk writes are handed to a thread pool), and
+the DCT and ECC work runs in a process pool, so one process can hold many
+slow uploads in flight. ASGI_PROCESSES sets the pool
+size (default: one per core).
+"""
+
+import os
+import json
+import asyncio
+from functools import partial
+from urllib.parse import parse_qs
+from concurrent.futures import ProcessPoolExecutor
+
+from ecc_crypto import KEYGEN_BATCH
+from uploads import (UploadError, UploadParser, ChunkWriter, create_upload, upload_status, MAX_UPLOAD_BYTES,
+                     MAX_FIELD_BYTES)
+import store
+from service import (MAX_KEYGEN_COUNT, MAX_BULK_LICENSES, LICENSE_BATCH, SIGNATURE_WINDOW, warm_up,
+                     embed_preflight, verify_preflight, keypair, keypair_lines, make_license, make_licenses,
+                     claim_embed_upload, embed_file, verify_file, verify_upload, check_signatures)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "templates", "index.html")
+FILE_CHUNK_SIZE = 64 * 1024
+OUTPUTS_PREFIX = "/outputs/"
+UPLOADS_PREFIX = "/uploads/"
+
+_pool = None
+
+
+def start_pool():
+    """Start the worker processes; each warms its curve tables and DCT plans once"""
+    global _pool
+    if _pool is None:
+        processes = int(os.environ.get("ASGI_PROCESSES", 0)) or os.cpu_count()
+        _pool = ProcessPoolExecutor(processes, initializer=warm_up,
+                                    initargs=(os.environ.get("PRELOAD_PUBLIC_KEYS"),))
+    return _pool
+
+
+async def run_in_pool(func, *args):
+    """Run CPU-bound work in the process pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(start_pool(), partial(func, *args))
+
+
+async def run_in_thread(func, *args):
+    """Run blocking file I/O in the default thread pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+
+async def send_response(send, status, body, content_type="application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()),
+                    (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, body, status=200):
+    await send_response(send, status, json.dumps(body).encode())
+
+
+async def read_body(receive, limit=MAX_UPLOAD_BYTES):
+    """Read a whole (small) request body"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > limit:
+            raise UploadError(f"Upload exceeds the {limit // (1024 * 1024)} MB limit", 413)
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+async def receive_upload(scope, receive, file_field, preflight=None, multiple=False):
+    """
+    Stream a multipart request body into an UploadParser
+
+    The body is consumed message by message as it arrives and written to
+    disk from a worker thread; a preflight rejection stops reading
+    immediately. Returns (fields, path), or (fields, file entries) with
+    multiple set.
+    """
+    headers = dict(scope["headers"])
+    length = int(headers.get(b"content-length", 0))
+    if length > MAX_UPLOAD_BYTES:
+        raise UploadError(f"Upload exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit", 413)
+
+    parser = UploadParser(headers.get(b"content-type", b"").decode("latin-1"), file_field, preflight, multiple)
+    received = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            await run_in_thread(parser.abort)
+            raise UploadError("Client disconnected")
+
+        chunk = message.get("body", b"")
+        received += len(chunk)
+        if received > MAX_UPLOAD_BYTES:
+            await run_in_thread(parser.abort)
+            raise UploadError(f"Upload exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit", 413)
+
+        if chunk:
+            await run_in_thread(parser.feed, chunk)
+        if not message.get("more_body", False):
+            # Raises for truncated bodies
+            await run_in_thread(parser.feed, None)
+            return parser.fields, parser.files if multiple else parser.path
+
+
+async def index(scope, receive, send):
+    with open(TEMPLATE_PATH, "rb") as f:
+        await send_response(send, 200, f.read(), "text/html; charset=utf-8")
+
+
+async def generate_keys(scope, receive, send):
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if "count" not in query:
+        await send_json(send, await run_in_pool(keypair))
+        return
+
+    try:
+        count = int(query["count"][0])
+    except ValueError:
+        count = 0
+    if not 1 <= count <= MAX_KEYGEN_COUNT:
+        await send_json(send, {"error": f"count must be between 1 and {MAX_KEYGEN_COUNT}"}, 400)
+        return
+
+    # Stream the pairs as JSON lines, one batch at a time
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    for start in range(0, count, KEYGEN_BATCH):
+        lines = await run_in_pool(keypair_lines, min(KEYGEN_BATCH, count - start))
+        await send({"type": "http.response.body", "body": lines.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def generate_license(scope, receive, send):
+    try:
+        data = json.loads(await read_body(receive))
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        await send_json(send, {"error": "Expected a JSON license request"}, 400)
+        return
+
+    try:
+        license_text = await run_in_pool(make_license, data)
+    except KeyError as e:
+        await send_json(send, {"error": f"Invalid request: missing {e}"}, 400)
+        return
+    except (TypeError, ValueError) as e:
+        await send_json(send, {"error": f"Invalid request: {e}"}, 400)
+        return
+    await send_json(send, {"license": license_text})
+
+
+async def stream_ndjson(send, results):
+    """Send each list of results of an async iterator as JSON lines as soon as it's ready"""
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    async for items in results:
+        lines = "".join(json.dumps(item) + "\n" for item in items)
+        await send({"type": "http.response.body", "body": lines.encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _completed(awaitables):
+    """Results of awaitables in the order they finish"""
+    for awaitable in asyncio.as_completed(awaitables):
+        yield await awaitable
+
+
+async def generate_licenses(scope, receive, send):
+    try:
+        items = json.loads(await read_body(receive))
+    except ValueError:
+        items = None
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BULK_LICENSES:
+        await send_json(send, {"error": f"Expected a JSON array of 1 to {MAX_BULK_LICENSES} license requests"}, 400)
+        return
+
+    # Batches run in parallel in the pool and are sent back as they finish
+    batches = [run_in_pool(make_licenses, items[start:start + LICENSE_BATCH], start)
+               for start in range(0, len(items), LICENSE_BATCH)]
+    await stream_ndjson(send, _completed(batches))
+
+
+async def embed_audio(scope, receive, send):
+    fields, input_path = await receive_upload(scope, receive, "audio", embed_preflight)
+
+    try:
+        license_data = fields.get("license")
+        if not license_data:
+            await send_json(send, {"error": "Missing license"}, 400)
+            return
+
+        key = await run_in_pool(embed_file, license_data, input_path)
+    finally:
+        os.unlink(input_path)
+    if not key:
+        await send_json(send, {"error": "Failed to embed license"}, 500)
+        return
+
+    await send_output(scope, send, key)
+
+
+async def start_upload(scope, receive, send):
+    """Start a resumable upload: {"size": bytes} -> {"upload_id", "offset", "size"}"""
+    try:
+        data = json.loads(await read_body(receive, MAX_FIELD_BYTES))
+    except ValueError:
+        data = None
+    size = data.get("size") if isinstance(data, dict) else None
+    await send_json(send, await run_in_thread(create_upload, size), 201)
+
+
+async def put_upload_chunk(scope, receive, send, upload_id):
+    """Append the request body at the Upload-Offset header's position, message by message"""
+    offset = dict(scope["headers"]).get(b"upload-offset", b"")
+    writer = await run_in_thread(ChunkWriter, upload_id, int(offset) if offset.isdigit() else None)
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                await run_in_thread(writer.close)  # Keep what arrived; the client resumes from there
+                return
+            await run_in_thread(writer.feed, message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+    except BaseException:
+        writer.close()
+        raise
+    await send_json(send, await run_in_thread(writer.close))
+
+
+async def embed_upload(scope, receive, send, upload_id):
+    """Embed {"license": ...} into a finished resumable upload"""
+    try:
+        data = json.loads(await read_body(receive, MAX_FIELD_BYTES))
+    except ValueError:
+        data = None
+    license_data = data.get("license") if isinstance(data, dict) else None
+    if not license_data:
+        await send_json(send, {"error": "Missing license"}, 400)
+        return
+
+    input_path = await run_in_thread(claim_embed_upload, upload_id, license_data)
+    try:
+        key = await run_in_pool(embed_file, license_data, input_path)
+    finally:
+        os.unlink(input_path)
+    if not key:
+        await send_json(send, {"error": "Failed to embed license"}, 500)
+        return
+
+    await send_output(scope, send, key)
+
+
+async def upload_route(scope, receive, send):
+    """/uploads/<id> (GET status, PUT chunk) and /uploads/<id>/embed (POST)"""
+    upload_id, _, action = scope["path"][len(UPLOADS_PREFIX):].partition("/")
+    method = scope["method"]
+    if not action and method == "GET":
+        await send_json(send, upload_status(upload_id))
+    elif not action and method == "PUT":
+        await put_upload_chunk(scope, receive, send, upload_id)
+    elif action == "embed" and method == "POST":
+        await embed_upload(scope, receive, send, upload_id)
+    else:
+        await send_json(send, {"error": "Not found"}, 404)
+
+
+async def download_output(scope, receive, send, key):
+    """Download (or resume downloading) a stored stego output"""
+    if not store.lookup(key):
+        await send_json(send, {"error": "Output not found"}, 404)
+        return
+    await send_output(scope, send, key)
+
+
+def parse_range(value, size):
+    """
+    (start, end) of a single "bytes=" Range header, or None to send everything
+
+    Raises ValueError for ranges outside the file.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            start, end = max(0, size - int(last)), size
+        else:
+            start, end = int(first), min(size, int(last) + 1) if last else size
+    except ValueError:
+        return None
+    if start >= end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+async def send_output(scope, send, key):
+    """
+    Send a stored output with its key as ETag
+
+    GET requests get 304 for a matching If-None-Match and 206 for a single
+    byte range. The file goes out through the server's zero-copy extension
+    when it offers one. It is opened first, so an output evicted before
+    that is a 404.
+    """
+    try:
+        f = open(store.output_path(key), "rb")
+    except FileNotFoundError:
+        await send_json(send, {"error": "Output not found"}, 404)
+        return
+
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        request_headers = dict(scope["headers"])
+        etag = f'"{key}"'.encode()
+        headers = [(b"etag", etag), (b"accept-ranges", b"bytes"), (b"content-location", f"/outputs/{key}".encode())]
+
+        start, end, status = 0, size, 200
+        if scope["method"] == "GET":
+            if_none_match = [tag.strip() for tag in request_headers.get(b"if-none-match", b"").split(b",")]
+            if etag in if_none_match or b"*" in if_none_match:
+                await send_response(send, 304, b"", "audio/wav", headers)
+                return
+
+            try:
+                byte_range = parse_range(request_headers.get(b"range", b"").decode("latin-1"), size)
+            except ValueError:
+                await send_json(send, {"error": "Range not satisfiable"}, 416)
+                return
+            if byte_range:
+                (start, end), status = byte_range, 206
+                headers.append((b"content-range", f"bytes {start}-{end - 1}/{size}".encode()))
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"audio/wav"),
+                        (b"content-length", str(end - start).encode()),
+                        (b"content-disposition", b'attachment; filename="stego_output.wav"'), *headers],
+        })
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            await send({"type": "http.response.zerocopysend", "file": f, "offset": start, "count": end - start})
+            return
+
+        f.seek(start)
+        remaining = end - start
+        while remaining and (chunk := f.read(min(FILE_CHUNK_SIZE, remaining))):
+            remaining -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def verify_license(scope, receive, send):
+    fields, audio_path = await receive_upload(scope, receive, "audio", verify_preflight)
+    body, status = await run_in_pool(verify_file, audio_path, fields.get("public_key"), bool(fields.get("prefix")))
+    await send_json(send, body, status)
+
+
+async def verify_licenses(scope, receive, send):
+    fields, entries = await receive_upload(scope, receive, "audio", verify_preflight, multiple=True)
+    public_key = fields.get("public_key")
+
+    checks = [run_in_pool(verify_upload, i, entry, public_key) for i, entry in enumerate(entries)]
+
+    # Failures go out as soon as they are known; the signatures of the
+    # opened licenses are batch-checked a window at a time, and each window
+    # goes out after its check
+    async def results():
+        pending = []
+        async for result, signed in _completed(checks):
+            if signed is None:
+                yield [result]
+                continue
+            pending.append((result, signed))
+            if len(pending) == SIGNATURE_WINDOW:
+                yield await run_in_pool(check_signatures, pending, public_key)
+                pending = []
+        if pending:
+            yield await run_in_pool(check_signatures, pending, public_key)
+
+    await stream_ndjson(send, results())
+
+
+ROUTES = {
+    ("GET", "/"): index,
+    ("GET", "/generate_keys"): generate_keys,
+    ("POST", "/generate_license"): generate_license,
+    ("POST", "/generate_licenses"): generate_licenses,
+    ("POST", "/embed_audio"): embed_audio,
+    ("POST", "/uploads"): start_upload,
+    ("POST", "/verify_license"): verify_license,
+    ("POST", "/verify_licenses"): verify_licenses,
+}
+
+
+async def lifespan(receive, send):
+    global _pool
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start_pool()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _pool is not None:
+                _pool.shutdown()
+                _pool = None
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["path"].startswith(OUTPUTS_PREFIX) and scope["method"] in ("GET", "HEAD"):
+        await download_output(scope, receive, send, scope["path"][len(OUTPUTS_PREFIX):])
+        return
+
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None and scope["path"].startswith(UPLOADS_PREFIX):
+        handler = upload_route
+    if handler is None:
+        status = 405 if any(path == scope["path"] for _, path in ROUTES) else 404
+        await send_json(send, {"error": "Not found" if status == 404 else "Method not allowed"}, status)
+        return
+
+    try:
+        await handler(scope, receive, send)
+    except UploadError as e:
+        await send_json(send, {"error": str(e)}, e.status)
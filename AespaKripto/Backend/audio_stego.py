@@ -7,238 +7,960 @@ Handles embedding and extracting data from audio files
 import numpy as np
 from scipy.io import wavfile
 from scipy.fftpack import dct, idct
+import os
+import struct
 import math
+import re
+import zlib
+import hashlib
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
 
 # Constants for DCT steganography
 BLOCK_SIZE = 8192  # Size of audio blocks for DCT
 USABLE_COEFFS = 1000  # Number of DCT coefficients to use for embedding
 ALPHA = 0.08  # Strength of embedding (higher = more robust but more audible)
-MAX_REASONABLE_LENGTH = 1000000000000  # Maximum reasonable length for embedded data
+MAX_REASONABLE_LENGTH = 1000000  # Maximum reasonable length for embedded data
+
+# Working precision for the DCT. float64 is the reference path; float32 halves
+# memory and doubles SIMD width, which is plenty for 8/16-bit sources.
+DEFAULT_DTYPE = np.float64
+SUPPORTED_DTYPES = (np.float32, np.float64)
+
+# Float samples (full scale +-1) are processed in 16-bit LSB units, so the
+# unit-scale parity lattice is as fine as it is for int16 sources
+FLOAT_SCALE = 32768
+
+# WAV sample formats that can be rewritten in place: (format tag, bits) -> dtype
+WAV_SAMPLE_DTYPES = {(1, 16): "<i2", (1, 32): "<i4", (3, 32): "<f4", (3, 64): "<f8"}
+
+# FLAC sample formats: (dtype read as, right shift back to the sample range)
+FLAC_SUBTYPES = {"PCM_16": (np.int16, 0), "PCM_24": (np.int32, 8)}
+
+# Sync preamble written at the start of the payload stream (before a copy of
+# the 32-bit length) so the payload can be found without the header block
+SYNC_WORD = 0x9D2C56804F1BE36A
+SYNC_LENGTH = 64
+SYNC_BITS = [int(bit) for bit in bin(SYNC_WORD)[2:].zfill(SYNC_LENGTH)]
+PREAMBLE_BITS = SYNC_LENGTH + 32
+SYNC_TOLERANCE = 6  # Bit errors accepted when matching the sync pattern
+SYNC_SEARCH_BLOCKS = 64  # Blocks scanned when the header is unusable
+STEP_FIT_THRESHOLD = 0.15  # Mean distance from the band centre that marks a block's step when recovering
+
+# Stego format variants. All of them put a 32-bit length in block 0 and read
+# bits as the parity of the integer part of |coefficient|; detect_format tells
+# them apart from one DCT of block 0.
+FORMAT_UNSYNCED = 1  # Aespa and early Karina files: data straight after the length header
+FORMAT_SYNC = 2  # Payload stream starts with the sync preamble
+FORMAT_TUNED = 3  # Tagged block-0 header with per-block strength
+FORMAT_VERSION = FORMAT_TUNED  # Written by embed_data_in_audio
+FORMAT_NAMES = {FORMAT_UNSYNCED: "unsynced (v1)", FORMAT_SYNC: "sync preamble (v2)", FORMAT_TUNED: "tuned (v3)"}
+
+# Embedding strength: each block's parity is taken on a quantization lattice
+# of one of these steps. Parity moves smaller than the sample LSB are undone
+# when an integer file is written, so at-risk blocks get a coarser lattice.
+# Steps are chosen per block and recorded (as 3-bit codes) in a tuned header
+# placed in block 0 after the 32 legacy length bits.
+STRENGTH_STEPS = (1, 2, 3, 4, 6, 8, 12, 16)
+TUNED_ALPHA = 0.5  # Blocks above the unit step sit at the centre of their parity band
+STRENGTH_CODE_BITS = 3
+TUNED_MAGIC = 0xA5C3
+TUNED_HEADER_SLOT = 32  # First block-0 coefficient slot of the tuned header
+TUNED_FIXED_BITS = 16 + 8 + 32 + 16  # magic, format version, data length, CRC
+MAX_TUNED_BLOCKS = (USABLE_COEFFS - TUNED_HEADER_SLOT - TUNED_FIXED_BITS) // STRENGTH_CODE_BITS
 
 
 def string_to_bit_array(text):
     """Convert a string to a bit array"""
-    bits = []
+    result = []
     for char in text.encode('utf-8'):
-        # ubah setiap karakter jadi 8 bit
-        bits.extend([int(b) for b in bin(char)[2:].zfill(8)])
-    return bits
+        bits = bin(char)[2:].zfill(8)
+        for bit in bits:
+            result.append(int(bit))
+    return result
 
 
 def bit_array_to_string(bits):
     """Convert a bit array to a string"""
-    # Pastikan panjang bits kelipatan 8
+    # Ensure bit array length is multiple of 8
     while len(bits) % 8 != 0:
-        bits.append(0)  # padding 0 jika kurang
-
-    bytes_arr = bytearray()
+        bits.append(0)
+    
+    result = bytearray()
     for i in range(0, len(bits), 8):
+        byte_bits = bits[i:i+8]
         byte_val = 0
-        for bit in bits[i:i+8]:
-            byte_val = (byte_val << 1) | bit
-        bytes_arr.append(byte_val)
-
-    # Hapus padding null bytes di akhir (jika ada)
-    while bytes_arr and bytes_arr[-1] == 0:
-        bytes_arr.pop()
-
+        for j in range(8):
+            byte_val = (byte_val << 1) | byte_bits[j]
+        result.append(byte_val)
+    
+    # Remove padding null bytes from the end
+    while result and result[-1] == 0:
+        result.pop()
+    
     try:
-        return bytes_arr.decode('utf-8')
+        return result.decode('utf-8')
     except UnicodeDecodeError:
-        # Jika error decode, coba decode sampai bagian valid terakhir
-        for i in range(len(bytes_arr), 0, -1):
+        # In case of decode error, return up to the last valid character
+        for i in range(len(result), 0, -1):
             try:
-                return bytes_arr[:i].decode('utf-8')
+                return result[:i].decode('utf-8')
             except UnicodeDecodeError:
                 continue
         return ""
 
 
-def embed_data_in_audio(data, input_audio_path, output_audio_path):
-    """Embed data in audio file using DCT steganography"""
+def working_dtype(source_dtype, dtype=None):
+    """Resolve the float precision used to process samples of source_dtype"""
+    work = np.dtype(DEFAULT_DTYPE if dtype is None else dtype)
+    if work.type not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported working precision: {work}")
+    
+    # float32 has a 24-bit mantissa, so it cannot hold 32-bit integer samples exactly
+    source_dtype = np.dtype(source_dtype)
+    if work == np.float32 and source_dtype.kind in "iu" and source_dtype.itemsize > 2:
+        work = np.dtype(np.float64)
+    
+    return work
+
+
+def is_flac(audio_path):
+    """FLAC files are recognised by their extension"""
+    return os.path.splitext(audio_path)[1].lower() == ".flac"
+
+
+def read_flac(audio_path, frames=-1):
+    """
+    Decode the first frames of a FLAC file (all of them by default)
+    
+    FLAC seeks by frame, so only the requested part of the file is decoded.
+    24-bit samples are returned as int32 in their 24-bit range.
+    """
+    if soundfile is None:
+        raise ImportError("FLAC support needs the soundfile package")
+    
+    with soundfile.SoundFile(audio_path) as f:
+        if f.subtype not in FLAC_SUBTYPES:
+            raise ValueError(f"Unsupported FLAC sample format: {f.subtype}")
+        sample_dtype, shift = FLAC_SUBTYPES[f.subtype]
+        audio_data = f.read(frames, dtype=sample_dtype)
+        return f.samplerate, audio_data >> shift if shift else audio_data
+
+
+def write_audio(audio_path, sample_rate, samples):
+    """Write samples as WAV, or as FLAC when audio_path ends in .flac"""
+    if not is_flac(audio_path):
+        wavfile.write(audio_path, sample_rate, samples)
+        return
+    
+    if soundfile is None:
+        raise ImportError("FLAC support needs the soundfile package")
+    for subtype, (sample_dtype, shift) in FLAC_SUBTYPES.items():
+        if samples.dtype != sample_dtype:
+            continue
+        limit = 1 << (31 - shift)
+        if shift and (samples.max() >= limit or samples.min() < -limit):
+            raise ValueError(f"Samples exceed the range of {subtype} FLAC")
+        soundfile.write(audio_path, samples << shift if shift else samples, sample_rate, format="FLAC", subtype=subtype)
+        return
+    
+    raise ValueError(f"FLAC output needs 16- or 24-bit integer samples, not {samples.dtype}")
+
+
+def read_audio(audio_path, dtype=None, frames=-1):
+    """Read a WAV or FLAC file as mono samples in the working precision
+    
+    frames limits how many leading frames are returned (FLAC files decode
+    only those). Returns (sample_rate, original_samples, working_samples).
+    """
+    if is_flac(audio_path):
+        sample_rate, audio_data = read_flac(audio_path, frames)
+    else:
+        sample_rate, audio_data = wavfile.read(audio_path)
+        if frames >= 0:
+            audio_data = audio_data[:frames]
+    work = working_dtype(audio_data.dtype, dtype)
+    
+    # Ensure audio data is mono
+    if len(audio_data.shape) > 1:
+        # Convert stereo to mono by averaging channels
+        audio_data = np.mean(audio_data, axis=1, dtype=work).astype(audio_data.dtype)
+    
+    return sample_rate, audio_data, to_working(audio_data, work)
+
+
+def to_working(samples, work):
+    """Working samples of source samples; float sources are scaled by FLOAT_SCALE"""
+    if samples.dtype.kind == "f":
+        return np.multiply(samples, FLOAT_SCALE, dtype=work)
+    return samples.astype(work)
+
+
+def to_source_dtype(samples, source_dtype, sample_bits=None):
+    """Requantize working samples back to the dtype they were read as
+    
+    sample_bits narrows the integer range for samples held in a wider
+    dtype, such as 24-bit FLAC read as int32. Float sources are scaled back
+    to full scale and clipped to +-1.
+    """
+    source_dtype = np.dtype(source_dtype)
+    if np.issubdtype(source_dtype, np.integer):
+        # Round (not truncate) and clip to the original data type range
+        info = np.iinfo(source_dtype)
+        low, high = (-(1 << (sample_bits - 1)), (1 << (sample_bits - 1)) - 1) if sample_bits else (info.min, info.max)
+        samples = np.rint(samples)
+        np.clip(samples, low, high, out=samples)
+    else:
+        samples = samples / FLOAT_SCALE
+        np.clip(samples, -1, 1, out=samples)
+    return samples.astype(source_dtype)
+
+
+def coeffs_to_bits(coeffs):
+    """Read the bits carried by the parity of DCT coefficients"""
+    return (np.abs(coeffs) % 2 >= 1).astype(np.uint8)
+
+
+def set_coeff_parity(coeffs, bits, alpha=ALPHA):
+    """Move each coefficient into the parity band of its bit
+    
+    Odd integer part encodes 1, even encodes 0. Coefficients end up at least
+    alpha inside their band; the sign is preserved.
+    """
+    bits = np.asarray(bits)
+    magnitude = np.abs(coeffs)
+    base = np.floor(magnitude)
+    frac = magnitude - base
+    wrong = (base % 2) != bits
+    
+    # Wrong parity: step into whichever neighbouring band is closer
+    up = base + 1 + alpha
+    down = base - alpha
+    moved = np.where((frac >= 0.5) | (down < 0), up, down)
+    kept = np.clip(magnitude, base + alpha, base + 1 - alpha)
+    
+    return np.copysign(np.where(wrong, moved, kept), coeffs).astype(coeffs.dtype)
+
+
+def bits_to_int(bits):
+    """Convert a big-endian bit array to an integer"""
+    return int(''.join(map(str, bits)), 2) if len(bits) else 0
+
+
+def block_coeffs(audio_float, first_block, block_count):
+    """Usable DCT coefficients (block x slot) of consecutive blocks, with one batched DCT"""
+    available = len(audio_float) // BLOCK_SIZE - first_block
+    block_count = max(0, min(block_count, available))
+    start_idx = first_block * BLOCK_SIZE
+    blocks = audio_float[start_idx:start_idx + block_count * BLOCK_SIZE].reshape(block_count, BLOCK_SIZE)
+    if block_count == 0:
+        return np.zeros((0, USABLE_COEFFS), dtype=audio_float.dtype)
+    return dct(blocks, type=2, norm='ortho', axis=1)[:, 10:10 + USABLE_COEFFS]
+
+
+def extract_block_bits(audio_float, first_block, block_count, steps=None):
+    """Read the payload bits of consecutive blocks with one batched DCT
+    
+    steps optionally gives the quantization step of each block.
+    """
+    blocks_dct = block_coeffs(audio_float, first_block, block_count)
+    block_count = len(blocks_dct)
+    if block_count == 0:
+        return np.zeros(0, dtype=np.uint8)
+    if steps is not None:
+        blocks_dct = blocks_dct / np.asarray(steps, dtype=blocks_dct.dtype)[:block_count, None]
+    return coeffs_to_bits(blocks_dct).ravel()
+
+
+def extract_payload_bits(audio_float, data_length):
+    """Read data_length payload bits following the preamble after the header block"""
+    stream_length = PREAMBLE_BITS + data_length
+    tuned = read_tuned_header(audio_float)
+    steps = tuned[1] if tuned else None
+    stream = extract_block_bits(audio_float, 1, math.ceil(stream_length / USABLE_COEFFS), steps)
+    return stream[PREAMBLE_BITS:stream_length].tolist()
+
+
+def find_sync(stream, tolerance=SYNC_TOLERANCE):
+    """Locate the sync pattern in a bit stream
+    
+    Correlates the stream (as +/-1) against the pattern in one linear pass and
+    returns candidate bit offsets, best match first.
+    """
+    if len(stream) < SYNC_LENGTH:
+        return np.zeros(0, dtype=np.intp)
+    
+    signs = stream.astype(np.float32) * 2 - 1
+    pattern = np.array(SYNC_BITS, dtype=np.float32) * 2 - 1
+    scores = np.correlate(signs, pattern, mode='valid')
+    
+    # Each mismatched bit lowers the score by 2
+    candidates = np.flatnonzero(scores >= SYNC_LENGTH - 2 * tolerance)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def validate_payload(extracted_data):
+    """Return the extracted text if it looks like a license, else None"""
+    # Basic validation - check if it's likely a Base64 string
+    if re.match(r'^[A-Za-z0-9+/=]+$', extracted_data):
+        return extracted_data
+    
+    # Check if it looks like JSON
+    if extracted_data.startswith('{') and extracted_data.endswith('}'):
+        return extracted_data
+    
+    return None
+
+
+def decode_text(bits):
+    """Decode payload bits as license text, or None if they don't look like one"""
+    return validate_payload(bit_array_to_string(list(bits)))
+
+
+def step_fit(coeffs, first_bit, end_bit):
+    """
+    Mean distance of each block's payload coefficients from the centre of
+    their parity band on each strength lattice (block x STRENGTH_STEPS)
+    
+    Only the flattened slots first_bit..end_bit carry payload.
+    """
+    steps = np.array(STRENGTH_STEPS, dtype=coeffs.dtype)
+    slots = np.arange(coeffs.size).reshape(coeffs.shape)
+    used = (slots >= first_bit) & (slots < end_bit)
+    distance = np.abs(np.abs(coeffs)[:, None, :] / steps[None, :, None] % 1 - 0.5)
+    return (distance * used[:, None, :]).sum(axis=2) / np.maximum(used.sum(axis=1), 1)[:, None]
+
+
+def estimate_steps(fit):
+    """
+    Guess the strength step of each block from its step_fit
+    
+    Blocks above the unit step are embedded at the centre of their parity
+    band (TUNED_ALPHA), so on their own lattice the payload coefficients sit
+    near half-integers, and closer than on any coarser lattice they alias
+    to. Blocks that fit no lattice that way were embedded at the unit step.
+    """
+    best = fit[:, 1:].argmin(axis=1) + 1
+    fits = fit[np.arange(len(fit)), best] < STEP_FIT_THRESHOLD
+    return np.array(STRENGTH_STEPS)[np.where(fits, best, 0)]
+
+
+def candidate_steps(coeffs, first_bit, end_bit, sync_step):
+    """
+    Per-block step guesses for a payload found by its sync pattern, most likely first
+    
+    The block holding the sync pattern uses sync_step. The estimate is
+    followed by the other steps of the last block, which may carry too few
+    payload bits to estimate, then by sync_step for every block.
+    """
+    fit = step_fit(coeffs, first_bit, end_bit)
+    estimate = estimate_steps(fit)
+    estimate[0] = sync_step
+    
+    candidates = [estimate]
+    if len(estimate) > 1:
+        for level in np.argsort(fit[-1], kind='stable'):
+            candidates.append(np.concatenate([estimate[:-1], [STRENGTH_STEPS[level]]]))
+    candidates.append(np.full(len(estimate), sync_step))
+    
+    seen = set()
+    for steps in candidates:
+        if tuple(steps) not in seen:
+            seen.add(tuple(steps))
+            yield steps
+
+
+def recover_data(audio_float, decode=decode_text, search_blocks=SYNC_SEARCH_BLOCKS):
+    """Recover the payload by searching for the sync pattern
+    
+    Used when the header block is damaged or missing (e.g. trimmed audio);
+    the payload may start at any block offset within search_blocks. Tuned
+    files embed every block on its own strength lattice, so the pattern is
+    searched for on each lattice, and the steps of the payload blocks after
+    it are guessed with candidate_steps.
+    decode(bits) returns the decoded payload or None to reject a candidate.
+    """
+    coeffs = block_coeffs(audio_float, 0, search_blocks)
+    
+    for sync_step in STRENGTH_STEPS:
+        stream = coeffs_to_bits(coeffs / sync_step).ravel()
+        for offset in find_sync(stream):
+            length_bits = stream[offset + SYNC_LENGTH:offset + PREAMBLE_BITS]
+            if len(length_bits) < 32:
+                continue
+            
+            data_length = bits_to_int(length_bits)
+            if data_length <= 0 or data_length > MAX_REASONABLE_LENGTH:
+                continue
+            
+            # Read on past the search window if the payload is longer than it
+            first_block, first_bit = divmod(int(offset), USABLE_COEFFS)
+            data_end = first_bit + PREAMBLE_BITS + data_length
+            payload_coeffs = block_coeffs(audio_float, first_block, math.ceil(data_end / USABLE_COEFFS))
+            if payload_coeffs.size < data_end:
+                continue
+            
+            for steps in candidate_steps(payload_coeffs, first_bit, data_end, sync_step):
+                stream_bits = coeffs_to_bits(payload_coeffs / steps[:, None].astype(payload_coeffs.dtype)).ravel()
+                data = decode(stream_bits[first_bit + PREAMBLE_BITS:data_end])
+                if data:
+                    print(f"Recovered data from sync pattern at block {first_block} (bit offset {offset}, "
+                          f"steps {steps.tolist()})")
+                    return data
+    
+    return None
+
+
+def int_to_bits(value, width):
+    """Convert an integer to a big-endian bit list"""
+    return [int(bit) for bit in bin(value)[2:].zfill(width)]
+
+
+def tuned_header_bits(data_length, levels):
+    """Tuned header: magic, format version, data length, CRC and the strength code of each payload block"""
+    codes = [bit for level in levels for bit in int_to_bits(int(level), STRENGTH_CODE_BITS)]
+    body = int_to_bits(FORMAT_VERSION, 8) + int_to_bits(data_length, 32) + codes
+    crc = zlib.crc32(np.packbits(np.array(body, dtype=np.uint8)).tobytes()) & 0xFFFF
+    return int_to_bits(TUNED_MAGIC, 16) + body[:40] + int_to_bits(crc, 16) + codes
+
+
+def parse_tuned_header(header_coeffs):
+    """
+    Decode the tuned header from the usable DCT coefficients of block 0
+    
+    Tries each strength step for the header itself. Returns (data_length,
+    steps of blocks 1..n), or None if there is no tuned header.
+    """
+    coeffs = header_coeffs[TUNED_HEADER_SLOT:]
+    for step in STRENGTH_STEPS:
+        bits = coeffs_to_bits(coeffs / step)
+        if bits_to_int(bits[:16]) != TUNED_MAGIC or bits_to_int(bits[16:24]) != FORMAT_TUNED:
+            continue
+        
+        data_length = bits_to_int(bits[24:56])
+        block_count = math.ceil((PREAMBLE_BITS + data_length) / USABLE_COEFFS)
+        if data_length <= 0 or block_count > MAX_TUNED_BLOCKS:
+            continue
+        
+        codes = bits[TUNED_FIXED_BITS:TUNED_FIXED_BITS + block_count * STRENGTH_CODE_BITS]
+        levels = codes.reshape(-1, STRENGTH_CODE_BITS) @ [4, 2, 1]
+        if tuned_header_bits(data_length, levels)[56:72] != bits[56:72].tolist():
+            continue
+        
+        return data_length, np.array(STRENGTH_STEPS)[levels]
+    
+    return None
+
+
+def header_coeffs(audio_float):
+    """The usable DCT coefficients of block 0"""
+    return dct(audio_float[:BLOCK_SIZE], type=2, norm='ortho')[10:10 + USABLE_COEFFS]
+
+
+def read_tuned_header(audio_float):
+    """Find and decode the tuned header of block 0; see parse_tuned_header"""
+    if len(audio_float) < BLOCK_SIZE:
+        return None
+    return parse_tuned_header(header_coeffs(audio_float))
+
+
+def detect_format(audio_float):
+    """
+    Identify the stego format from one DCT of block 0
+    
+    Returns (FORMAT_TUNED, data_length, steps) for files with a tuned header,
+    else (None, data_length, None) with the legacy 32-bit length; the legacy
+    variants (with or without the sync preamble) share that header and are
+    told apart by decode_legacy from the payload blocks it reads anyway.
+    """
+    coeffs = header_coeffs(audio_float)
+    tuned = parse_tuned_header(coeffs)
+    if tuned:
+        return FORMAT_TUNED, tuned[0], tuned[1]
+    return None, bits_to_int(coeffs_to_bits(coeffs[:32])), None
+
+
+def payload_frames(audio_float):
+    """
+    Leading frames that hold the payload announced by block 0
+    
+    Lets a caller holding only the start of a track tell how much more it
+    needs. Returns None when block 0 carries no plausible length.
+    """
+    if len(audio_float) < BLOCK_SIZE:
+        return None
+    variant, data_length, steps = detect_format(audio_float)
+    if variant == FORMAT_TUNED:
+        return (len(steps) + 1) * BLOCK_SIZE
+    if 0 < data_length <= MAX_REASONABLE_LENGTH:
+        # The sync layout is the longest one a legacy header can describe
+        return (math.ceil((PREAMBLE_BITS + data_length) / USABLE_COEFFS) + 1) * BLOCK_SIZE
+    return None
+
+
+def _slot_grids(block_count, block0_bits, stream_bits, steps):
+    """Bit, step and used-slot grids (block x coefficient slot) for an embed"""
+    bits = np.zeros((block_count, USABLE_COEFFS), dtype=np.uint8)
+    used = np.zeros((block_count, USABLE_COEFFS), dtype=bool)
+    bits[0, :len(block0_bits)] = block0_bits
+    used[0, :len(block0_bits)] = True
+    bits[1:].reshape(-1)[:len(stream_bits)] = stream_bits
+    used[1:].reshape(-1)[:len(stream_bits)] = True
+    
+    # The legacy length bits keep the unit step; everything else uses its block's step
+    step_grid = np.repeat(np.asarray(steps, dtype=np.float64)[:, None], USABLE_COEFFS, axis=1)
+    step_grid[0, :min(TUNED_HEADER_SLOT, len(block0_bits))] = 1
+    return bits, used, step_grid
+
+
+def embed_stream(audio_float, block0_bits, stream_bits, alpha=ALPHA, steps=None):
+    """
+    Return a copy of audio_float with the header and payload stream embedded
+    
+    block0_bits go in the first block, stream_bits in the following ones.
+    steps optionally gives each block's quantization step (default 1).
+    
+    The parity changes are computed as a sparse delta in the DCT domain of
+    each block and added to the samples as idct(delta); since the DCT is
+    linear, coefficients that don't change are never round-tripped through
+    the transform. All blocks share one batched DCT and one batched IDCT.
+    """
+    block_count = 1 + math.ceil(len(stream_bits) / USABLE_COEFFS)
+    if steps is None:
+        steps = np.ones(block_count)
+    bits, used, step_grid = _slot_grids(block_count, block0_bits, stream_bits, steps)
+    
+    blocks = audio_float[:block_count * BLOCK_SIZE].reshape(block_count, BLOCK_SIZE)
+    coeffs = dct(blocks, type=2, norm='ortho', axis=1)[:, 10:10 + USABLE_COEFFS]
+    
+    # Skip the first few coefficients (they contain more energy)
+    alpha_grid = np.where(step_grid > 1, TUNED_ALPHA, alpha)
+    target = set_coeff_parity(coeffs / step_grid, bits, alpha_grid) * step_grid
+    full_delta = np.zeros_like(blocks)
+    full_delta[:, 10:10 + USABLE_COEFFS] = np.where(used, target - coeffs, 0)
+    
+    stego_audio = audio_float.copy()
+    stego_audio[:block_count * BLOCK_SIZE] += idct(full_delta, type=2, norm='ortho', axis=1).ravel()
+    return stego_audio
+
+
+def tune_embedding(audio_float, source_dtype, length_bits, stream_bits, alpha=ALPHA, sample_bits=None):
+    """
+    Embed with the weakest per-block strength that survives requantization
+    
+    Every round simulates writing the file (rounding and clipping to
+    source_dtype, or to sample_bits), reads all blocks back with one batched
+    DCT, and raises the strength of each block that lost bits, until every
+    block reads back or the failing ones are at the strongest step. Rounds only
+    embed into a copy of the leading payload blocks; the full track is copied
+    once at the end. Returns (stego_audio, report).
+    """
+    block_count = 1 + math.ceil(len(stream_bits) / USABLE_COEFFS)
+    if block_count - 1 > MAX_TUNED_BLOCKS:
+        raise ValueError(f"Payload too long for a tuned embed ({block_count - 1} > {MAX_TUNED_BLOCKS} blocks)")
+    
+    head = audio_float[:block_count * BLOCK_SIZE]
+    levels = np.zeros(block_count, dtype=np.intp)
+    rounds = 0
+    while True:  # Ends: every round raises a level, and levels are capped
+        rounds += 1
+        block0_bits = list(length_bits) + tuned_header_bits(len(stream_bits) - PREAMBLE_BITS, levels[1:])
+        steps = np.array(STRENGTH_STEPS)[levels]
+        stego_head = embed_stream(head, block0_bits, stream_bits, alpha, steps)
+        
+        # Simulate requantization and score every bit at once
+        written = to_working(to_source_dtype(stego_head, source_dtype, sample_bits), audio_float.dtype)
+        bits, used, step_grid = _slot_grids(block_count, block0_bits, stream_bits, steps)
+        coeffs = dct(written.reshape(block_count, BLOCK_SIZE), type=2, norm='ortho', axis=1)[:, 10:10 + USABLE_COEFFS]
+        errors = (coeffs_to_bits(coeffs / step_grid) != bits) & used
+        errors[0, :TUNED_HEADER_SLOT] = False  # the legacy length bits are best effort
+        block_errors = errors.sum(axis=1)
+        
+        # Raise every failing block that still has a stronger step; stop when none has
+        at_risk = block_errors > 0
+        raised = at_risk & (levels < len(STRENGTH_STEPS) - 1)
+        if not raised.any():
+            break
+        levels[raised] += 1
+    
+    report = {
+        "steps": [int(step) for step in np.array(STRENGTH_STEPS)[levels]],
+        "rounds": rounds,
+        "bit_errors": int(block_errors.sum()),
+        "verified": not at_risk.any(),
+    }
+    stego_audio = audio_float.copy()
+    stego_audio[:block_count * BLOCK_SIZE] = stego_head
+    return stego_audio, report
+
+
+def verify_embedded(stego_samples, work_dtype, bit_array):
+    """
+    Read the payload back from requantized stego samples
+    
+    Only the header and payload blocks are decoded. Returns the SHA-256 (hex)
+    of the recovered payload bits packed into bytes, or None if they don't
+    match bit_array.
+    """
+    tuned = read_tuned_header(to_working(stego_samples[:BLOCK_SIZE], work_dtype))
+    if not tuned:
+        return None
+    
+    data_length, steps = tuned
+    block_count = len(steps)
+    payload = to_working(stego_samples[BLOCK_SIZE:(block_count + 1) * BLOCK_SIZE], work_dtype)
+    stream = extract_block_bits(payload, 0, block_count, steps)
+    recovered = stream[PREAMBLE_BITS:PREAMBLE_BITS + data_length]
+    
+    if np.any(stream[:SYNC_LENGTH] != SYNC_BITS) or not np.array_equal(recovered, bit_array):
+        return None
+    return hashlib.sha256(np.packbits(recovered).tobytes()).hexdigest()
+
+
+def payload_capacity_bits(frame_count):
+    """Payload bits a track of frame_count (mono) samples can carry"""
+    blocks = min(frame_count // BLOCK_SIZE - 1, MAX_TUNED_BLOCKS)
+    return max(0, blocks * USABLE_COEFFS - PREAMBLE_BITS)
+
+
+def embed_data_in_audio(data, input_audio_path, output_audio_path, dtype=None, verify=False):
+    """Embed data in audio file using DCT steganography
+    
+    dtype selects the working precision (float64 by default, float32 opt-in).
+    """
+    return embed_bits_in_audio(string_to_bit_array(data), input_audio_path, output_audio_path, dtype, verify)
+
+
+def stamp_samples(audio_float, source_dtype, bit_array, verify=False, sample_bits=None):
+    """
+    Embed a bit array in working samples and requantize them to source_dtype
+    
+    sample_bits is the source's bit depth when it is narrower than
+    source_dtype (24-bit FLAC). Returns (stego samples in source_dtype, tuning report); see
+    embed_bits_in_audio. Raises ValueError if the payload doesn't fit or
+    doesn't survive.
+    """
+    bit_array = [int(bit) for bit in bit_array]
+    data_length = len(bit_array)
+    
+    # Embed data length at the beginning
+    length_bits = bin(data_length)[2:].zfill(32)
+    length_bit_array = [int(bit) for bit in length_bits]
+    
+    # The payload stream repeats the length after the sync pattern
+    stream_bits = SYNC_BITS + length_bit_array + bit_array
+    stream_length = len(stream_bits)
+    
+    # Calculate how many blocks we need
+    total_blocks = math.ceil(stream_length / USABLE_COEFFS)
+    required_samples = (total_blocks + 1) * BLOCK_SIZE  # +1 for the header block
+    
+    if required_samples > len(audio_float):
+        raise ValueError(f"Audio file too short for embedding {data_length} bits. Need at least {required_samples} samples.")
+    
+    # Use the weakest per-block strength that survives writing the file
+    stego_audio, report = tune_embedding(audio_float, source_dtype, length_bit_array, stream_bits,
+                                        sample_bits=sample_bits)
+    if not report["verified"]:
+        raise ValueError(f"{report['bit_errors']} bits don't survive requantization even at the highest strength")
+    
+    # Convert back to the original data type
+    stego_audio = to_source_dtype(stego_audio, source_dtype, sample_bits)
+    
+    if verify:
+        report["payload_sha256"] = verify_embedded(stego_audio, audio_float.dtype, bit_array)
+        if not report["payload_sha256"]:
+            raise ValueError("Embedded payload doesn't read back from the requantized samples")
+        print(f"Verified embedded payload (SHA-256 {report['payload_sha256']})")
+    
+    return stego_audio, report
+
+
+def embed_bits_in_audio(bit_array, input_audio_path, output_audio_path, dtype=None, verify=False):
+    """Embed a bit array in audio file using DCT steganography
+    
+    Returns the tuning report (strength step of each block, tuning rounds,
+    bit errors after simulated requantization), or False on failure.
+    
+    With verify set, the payload is read back from the requantized samples
+    in memory before the file is written, and the report gets the SHA-256 of
+    the recovered payload as "payload_sha256"; a mismatch is a failure.
+    """
     print(f"Embedding data in audio file: {input_audio_path}")
-
+    
     try:
-        sample_rate, audio_data = wavfile.read(input_audio_path)
-
-        # Jika stereo, konversi ke mono dengan rata-rata channel
-        if audio_data.ndim > 1:
-            audio_data = audio_data.mean(axis=1).astype(audio_data.dtype)
-
-        audio_float = audio_data.astype(float)
-
-        bit_array = string_to_bit_array(data)
-        data_length = len(bit_array)
-
-        # Hitung berapa blok yang dibutuhkan
-        total_blocks = math.ceil(data_length / USABLE_COEFFS)
-        required_samples = (total_blocks + 1) * BLOCK_SIZE  # +1 blok untuk header
-
-        if required_samples > len(audio_float):
-            raise ValueError(f"Audio file terlalu pendek untuk menyisipkan {data_length} bit. Butuh minimal {required_samples} samples.")
-
-        # Embed panjang data di blok pertama
-        length_bits = [int(b) for b in bin(data_length)[2:].zfill(32)]
-
-        stego_audio = audio_float.copy()
-
-        # Proses blok header (blok pertama)
-        block = stego_audio[:BLOCK_SIZE]
-        block_dct = dct(block, norm='ortho')
+        # Read the audio file as mono samples in the working precision
+        sample_rate, audio_data, audio_float = read_audio(input_audio_path, dtype)
+        
+        if is_flac(input_audio_path) and not is_flac(output_audio_path) and audio_data.dtype == np.int32:
+            # A WAV has no 24-bit sample type to keep the stamped values in
+            raise ValueError("24-bit FLAC sources must be stamped to a .flac output")
+        
+        # 24-bit FLAC samples are read as int32 but must stay in the 24-bit range
+        sample_bits = 24 if is_flac(input_audio_path) and audio_data.dtype == np.int32 else None
+        stego_audio, report = stamp_samples(audio_float, audio_data.dtype, bit_array, verify, sample_bits)
+        
+        # Save the output audio file
+        write_audio(output_audio_path, sample_rate, stego_audio)
+        print(f"Data embedded successfully. Output saved to {output_audio_path}")
+        print(f"Strength steps per block: {report['steps']} ({report['rounds']} tuning rounds)")
+        
+        return report
+    
+    except Exception as e:
+        print(f"Error embedding data in audio: {e}")
+        return False
 
-        for i in range(32):
-            coeff_index = i + 10  # lewati koefisien awal yg besar energinya
-            coeff_val = block_dct[coeff_index]
 
-            # Jika bit 1, buat nilai koefisien menjadi ganjil
-            if length_bits[i] == 1:
-                if int(abs(coeff_val)) % 2 == 0:
-                    # tambah atau kurang ALPHA agar ganjil
-                    block_dct[coeff_index] += ALPHA if coeff_val >= 0 else -ALPHA
+def wav_data_layout(audio_path):
+    """Byte offset, sample dtype, channel count and frame count of a WAV file's data chunk"""
+    with open(audio_path, "rb") as f:
+        riff = f.read(12)
+        if riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError("Not a WAV file")
+        
+        sample_format = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            
+            if chunk_id == b"fmt ":
+                fmt = f.read(size + (size & 1))
+                format_tag, channels, _, _, _, bits = struct.unpack_from("<HHIIHH", fmt)
+                if format_tag == 0xFFFE and size >= 26:
+                    # WAVE_FORMAT_EXTENSIBLE: the real tag starts the sub-format GUID
+                    format_tag = struct.unpack_from("<H", fmt, 24)[0]
+                if (format_tag, bits) not in WAV_SAMPLE_DTYPES:
+                    raise ValueError(f"Unsupported WAV sample format for in-place writes (tag {format_tag}, {bits} bits)")
+                sample_format = np.dtype(WAV_SAMPLE_DTYPES[format_tag, bits]), channels
+            
+            elif chunk_id == b"data":
+                if sample_format is None:
+                    raise ValueError("WAV data chunk comes before its format chunk")
+                sample_dtype, channels = sample_format
+                return f.tell(), sample_dtype, channels, size // (sample_dtype.itemsize * channels)
+            
             else:
-                # Jika bit 0, buat nilai koefisien genap
-                if int(abs(coeff_val)) % 2 == 1:
-                    block_dct[coeff_index] += ALPHA if coeff_val < 0 else -ALPHA
-
-        stego_audio[:BLOCK_SIZE] = idct(block_dct, norm='ortho')
-
-        # Embed data bit ke blok berikutnya
-        bit_index = 0
-        for block_index in range(1, total_blocks + 1):
-            start = block_index * BLOCK_SIZE
-            end = start + BLOCK_SIZE
-
-            block = stego_audio[start:end]
-            block_dct = dct(block, norm='ortho')
-
-            for i in range(USABLE_COEFFS):
-                if bit_index >= data_length:
-                    break
-
-                coeff_index = i + 10
-                coeff_val = block_dct[coeff_index]
-
-                if bit_array[bit_index] == 1:
-                    if int(abs(coeff_val)) % 2 == 0:
-                        block_dct[coeff_index] += ALPHA if coeff_val >= 0 else -ALPHA
-                else:
-                    if int(abs(coeff_val)) % 2 == 1:
-                        block_dct[coeff_index] += ALPHA if coeff_val < 0 else -ALPHA
-
-                bit_index += 1
-
-            stego_audio[start:end] = idct(block_dct, norm='ortho')
-
-            if bit_index >= data_length:
-                break
-
-        # Konversi kembali ke tipe data awal
-        if np.issubdtype(audio_data.dtype, np.integer):
-            info = np.iinfo(audio_data.dtype)
-            stego_audio = np.clip(stego_audio, info.min, info.max)
-            stego_audio = stego_audio.astype(audio_data.dtype)
-
-        wavfile.write(output_audio_path, sample_rate, stego_audio)
-        print(f"Data berhasil disisipkan ke {output_audio_path}")
-        return True
-
+                f.seek(size + (size & 1), 1)
+
+
+def restamp_data_in_audio(data, audio_path, dtype=None, verify=False):
+    """Replace the embedded data of a stamped WAV in place; see restamp_bits_in_audio"""
+    return restamp_bits_in_audio(string_to_bit_array(data), audio_path, dtype, verify)
+
+
+def restamp_bits_in_audio(bit_array, audio_path, dtype=None, verify=False):
+    """
+    Replace the embedded bits of a stamped WAV file in place
+    
+    Only the header and payload blocks at the start of the data chunk are
+    read, re-embedded and written back with a single pwrite, so the cost does
+    not depend on the track length. The file must be mono, as written by
+    embed_bits_in_audio. Nothing is written if the new payload needs more
+    blocks than the file has. Returns the tuning report, or False on failure.
+    """
+    print(f"Restamping audio file in place: {audio_path}")
+    
+    try:
+        if is_flac(audio_path):
+            raise ValueError("In-place restamping needs a WAV file (FLAC audio is compressed)")
+        
+        offset, sample_dtype, channels, frames = wav_data_layout(audio_path)
+        if channels != 1:
+            raise ValueError(f"In-place restamping needs a mono file, not {channels} channels")
+        
+        block_count = 1 + math.ceil((PREAMBLE_BITS + len(bit_array)) / USABLE_COEFFS)
+        if block_count * BLOCK_SIZE > frames:
+            raise ValueError(f"The new payload needs {block_count} blocks, the file has {frames // BLOCK_SIZE}")
+        
+        with open(audio_path, "r+b") as f:
+            f.seek(offset)
+            samples = np.fromfile(f, dtype=sample_dtype, count=block_count * BLOCK_SIZE)
+            audio_float = to_working(samples, working_dtype(sample_dtype, dtype))
+            
+            stego_audio, report = stamp_samples(audio_float, sample_dtype, bit_array, verify)
+            data = stego_audio.astype(sample_dtype).tobytes()
+            if hasattr(os, "pwrite"):
+                os.pwrite(f.fileno(), data, offset)
+            else:
+                f.seek(offset)
+                f.write(data)
+        
+        print(f"Data restamped successfully ({len(data)} bytes rewritten)")
+        print(f"Strength steps per block: {report['steps']} ({report['rounds']} tuning rounds)")
+        return report
+    
     except Exception as e:
-        print(f"Error saat embed data: {e}")
+        print(f"Error restamping audio: {e}")
         return False
 
 
-def extract_data_from_audio(audio_path):
-    """Extract data from audio file using DCT steganography"""
-    print(f"Extracting data from audio file: {audio_path}")
+def decode_tuned(audio_float, tuned, decode):
+    """Decode the payload described by a tuned header, or None"""
+    data_length, steps = tuned
+    print(f"Detected {FORMAT_NAMES[FORMAT_TUNED]} format, embedded data length: {data_length} bits")
+    stream = extract_block_bits(audio_float, 1, len(steps), steps)
+    sync_errors = np.count_nonzero(stream[:SYNC_LENGTH] != SYNC_BITS)
+    if len(stream) < PREAMBLE_BITS + data_length or sync_errors > SYNC_TOLERANCE:
+        return None
+    return decode(stream[PREAMBLE_BITS:PREAMBLE_BITS + data_length])
+
+
+def decode_legacy(audio_float, data_length, decode):
+    """
+    Decode a payload stamped at the unit step under a legacy length header
+    
+    One batched DCT reads enough blocks for the longer (sync preamble)
+    layout; a matching preamble selects FORMAT_SYNC, otherwise the same bits
+    are decoded as FORMAT_UNSYNCED. Returns the decoded payload or None.
+    """
+    stream = extract_block_bits(audio_float, 1, math.ceil((PREAMBLE_BITS + data_length) / USABLE_COEFFS))
+    sync_errors = np.count_nonzero(stream[:SYNC_LENGTH] != SYNC_BITS)
+    
+    if (len(stream) >= PREAMBLE_BITS + data_length and sync_errors <= SYNC_TOLERANCE
+            and bits_to_int(stream[SYNC_LENGTH:PREAMBLE_BITS]) == data_length):
+        variant, extracted_bits = FORMAT_SYNC, stream[PREAMBLE_BITS:PREAMBLE_BITS + data_length]
+    else:
+        variant, extracted_bits = FORMAT_UNSYNCED, stream[:data_length]
+    
+    print(f"Detected {FORMAT_NAMES[variant]} format, embedded data length: {data_length} bits")
+    return decode(extracted_bits)
+
+
+def extract_leading_blocks(audio_path, decode, dtype=None):
+    """
+    Decode a tuned payload reading only the blocks that carry it
+    
+    Reads block 0 first, then exactly the payload blocks its header lists,
+    so compressed files are never decoded in full. Returns None when the
+    file has no valid tuned payload.
+    """
+    _, _, header_block = read_audio(audio_path, dtype, BLOCK_SIZE)
+    tuned = read_tuned_header(header_block)
+    if not tuned:
+        return None
+    
+    _, _, audio_float = read_audio(audio_path, dtype, (len(tuned[1]) + 1) * BLOCK_SIZE)
+    return decode_tuned(audio_float, tuned, decode)
 
-    try:
-        sample_rate, audio_data = wavfile.read(audio_path)
 
-        if audio_data.ndim > 1:
-            audio_data = audio_data.mean(axis=1).astype(audio_data.dtype)
+def extract_data_from_audio(audio_path, dtype=None):
+    """Extract data from audio file using DCT steganography
+    
+    dtype selects the working precision (float64 by default, float32 opt-in).
+    """
+    return extract_payload_from_audio(audio_path, decode_text, dtype)
 
-        audio_float = audio_data.astype(float)
 
+def extract_payload_from_audio(audio_path, decode, dtype=None):
+    """Extract the embedded bits from audio file and decode them
+    
+    decode(bits) returns the decoded payload, or None when the bits are not
+    valid, in which case the sync pattern search is tried.
+    """
+    print(f"Extracting data from audio file: {audio_path}")
+    
+    try:
+        if is_flac(audio_path):
+            # Seek to the payload blocks; the whole file is only decoded to fall back
+            extracted_data = extract_leading_blocks(audio_path, decode, dtype)
+            if extracted_data:
+                return extracted_data
+        
+        # Read the audio file as mono samples in the working precision
+        sample_rate, audio_data, audio_float = read_audio(audio_path, dtype)
+        
+        # Check if audio file is long enough for the header
         if len(audio_float) < BLOCK_SIZE:
-            print("Audio terlalu pendek untuk ekstraksi data")
+            print("Audio file too short to contain embedded data")
             return None
-
-        first_block = audio_float[:BLOCK_SIZE]
-        first_block_dct = dct(first_block, norm='ortho')
-
-        length_bits = []
-        for i in range(32):
-            coeff_index = i + 10
-            coeff_val = first_block_dct[coeff_index]
-
-            bit = 1 if int(abs(coeff_val)) % 2 == 1 else 0
-            length_bits.append(bit)
-
-        data_length = int("".join(map(str, length_bits)), 2)
-
-        if data_length <= 0 or data_length > MAX_REASONABLE_LENGTH:
-            print(f"Panjang data tidak valid: {data_length}")
-            return None
-
-        total_blocks = math.ceil(data_length / USABLE_COEFFS)
-        required_samples = (total_blocks + 1) * BLOCK_SIZE
-
+        
+        # One DCT of block 0 tells the format and the data length
+        variant, data_length, steps = detect_format(audio_float)
+        if variant == FORMAT_TUNED:
+            extracted_data = decode_tuned(audio_float, (data_length, steps), decode)
+            if extracted_data:
+                return extracted_data
+            print("Tuned payload doesn't appear to be valid")
+            print("Searching for the sync pattern...")
+            return recover_data(audio_float, decode)
+        
+        if data_length <= 0 or data_length > MAX_REASONABLE_LENGTH:  # Sanity check
+            print(f"Invalid data length extracted: {data_length}")
+            print("Searching for the sync pattern...")
+            return recover_data(audio_float, decode)
+        
+        # The unsynced layout is the shortest one a legacy header can describe
+        required_samples = (math.ceil(data_length / USABLE_COEFFS) + 1) * BLOCK_SIZE  # +1 for the header block
         if required_samples > len(audio_float):
-            print("Audio terlalu pendek untuk ekstraksi data")
+            print(f"Audio file too short for extracting {data_length} bits")
             return None
-
-        extracted_bits = []
-        bits_extracted = 0
-
-        for block_index in range(1, total_blocks + 1):
-            start = block_index * BLOCK_SIZE
-            end = start + BLOCK_SIZE
-
-            block = audio_float[start:end]
-            block_dct = dct(block, norm='ortho')
-
-            for i in range(USABLE_COEFFS):
-                if bits_extracted >= data_length:
-                    break
-
-                coeff_index = i + 10
-                coeff_val = block_dct[coeff_index]
-
-                bit = 1 if int(abs(coeff_val)) % 2 == 1 else 0
-                extracted_bits.append(bit)
-                bits_extracted += 1
-
-            if bits_extracted >= data_length:
-                break
-
-        extracted_data = bit_array_to_string(extracted_bits)
-
-        # Validasi sederhana: apakah data tampak JSON atau base64?
-        import re
-        if re.match(r'^[A-Za-z0-9+/=]+$', extracted_data) or (extracted_data.startswith('{') and extracted_data.endswith('}')):
+        
+        extracted_data = decode_legacy(audio_float, data_length, decode)
+        if extracted_data:
             return extracted_data
-
-        print("Data yang di-ekstrak tidak valid")
-        return None
-
+        
+        print("Extracted data doesn't appear to be valid")
+        print("Searching for the sync pattern...")
+        return recover_data(audio_float, decode)
+    
     except Exception as e:
-        print(f"Error saat ekstraksi data: {e}")
+        print(f"Error extracting data from audio: {e}")
         return None
 
 
-# Jika file ini dijalankan langsung, lakukan test embed dan extract
+# Test the functions if executed directly
 if __name__ == "__main__":
-    import os
-
-    test_message = "Ini adalah pesan tes untuk audio steganography menggunakan DCT"
+    test_message = "This is a test message for audio steganography using DCT"
     input_audio = "input.wav"
     output_audio = "output_stego.wav"
-
+    
+    import base64
+    import tempfile
+    
+    # Format variants are checked by format_check.py
+    license_text = base64.b64encode(test_message.encode()).decode()
+    with tempfile.TemporaryDirectory() as workdir:
+        fixture_audio = os.path.join(workdir, "fixture.wav")
+        rng = np.random.default_rng(0)
+        wavfile.write(fixture_audio, 44100, (3000 * rng.standard_normal(BLOCK_SIZE * 12)).astype(np.int16))
+        
+        # Cut off the header block: the sync search must still read the tuned payload blocks
+        long_text = base64.b64encode(rng.bytes(600)).decode()
+        stamped = os.path.join(workdir, "long_stamped.wav")
+        report = embed_data_in_audio(long_text, fixture_audio, stamped)
+        assert report and max(report["steps"]) > 1, "Tuned embed used no strength steps"
+        trimmed = os.path.join(workdir, "trimmed.wav")
+        sample_rate, samples = wavfile.read(stamped)
+        wavfile.write(trimmed, sample_rate, samples[BLOCK_SIZE:])
+        assert extract_data_from_audio(trimmed) == long_text, "Trimmed tuned file test failed"
+        print("Trimmed file recovery test passed")
+        
+        if soundfile is not None:
+            # Loud 24-bit FLAC: the stamped samples must stay in the 24-bit range
+            loud = os.path.join(workdir, "loud.flac")
+            samples = np.clip(6e6 * rng.standard_normal(BLOCK_SIZE * 4), -(1 << 23), (1 << 23) - 1).astype(np.int32)
+            soundfile.write(loud, samples << 8, 44100, format="FLAC", subtype="PCM_24")
+            stamped_flac = os.path.join(workdir, "loud_stamped.flac")
+            assert embed_data_in_audio(license_text, loud, stamped_flac, verify=True), "Loud 24-bit FLAC embed failed"
+            assert extract_data_from_audio(stamped_flac) == license_text, "Loud 24-bit FLAC test failed"
+            print("24-bit FLAC range test passed")
+    
     if not os.path.exists(input_audio):
-        print(f"File {input_audio} tidak ditemukan, lewati test.")
+        print(f"Test file {input_audio} not found. Skipping test.")
     else:
+        # Embed
         embed_data_in_audio(test_message, input_audio, output_audio)
+        
+        # Extract
         extracted = extract_data_from_audio(output_audio)
+        
         print(f"Original: {test_message}")
         print(f"Extracted: {extracted}")
-        assert test_message == extracted, "Test steganography gagal!"
+        
+        assert test_message == extracted, "Steganography test failed"
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for the license web service
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden with the environment variables below.
+"""
+
+import gc
+import os
+import multiprocessing
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# Embedding and verification are CPU-bound, so scale workers with cores and
+# keep a few threads each for requests waiting on uploads
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Import the app (and warm its curve and DCT state) once in the master, so
+# workers share that memory copy-on-write
+preload_app = True
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+# An empty GUNICORN_ACCESS_LOG turns access logging off
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+
+
+def when_ready(server):
+    # Move the preloaded objects out of the garbage collector's reach so
+    # collections in the workers don't touch (and copy) the shared pages
+    gc.freeze()
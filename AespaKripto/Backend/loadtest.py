@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Local load test for the license web service
+Fires concurrent /embed_audio and /verify_license requests at a running server
+and reports throughput and p50/p99 latency for each route
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    python loadtest.py --url http://127.0.0.1:8000 --requests 200 --concurrency 16
+"""
+
+import io
+import json
+import time
+import uuid
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.io import wavfile
+
+SAMPLE_RATE = 44100
+
+
+def make_wav(seconds):
+    """A synthetic float32 WAV (tone plus noise) as bytes"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    signal = 0.25 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    wavfile.write(buffer, SAMPLE_RATE, signal.astype(np.float32))
+    return buffer.getvalue()
+
+
+def multipart(fields, files):
+    """Encode form fields and (name -> bytes) files as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, data in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.wav"\r\n'
+                   f'Content-Type: audio/wav\r\n\r\n'.encode())
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def request(url, body=None, content_type=None):
+    """Send one request and return (status, response body)"""
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type} if content_type else {})
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def timed(url, body, content_type):
+    start = time.perf_counter()
+    status, _ = request(url, body, content_type)
+    return status, time.perf_counter() - start
+
+
+def run(url, body, content_type, total, concurrency):
+    """Send total identical requests with the given concurrency"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: timed(url, body, content_type), range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for _, latency in results]) * 1000
+    errors = sum(1 for status, _ in results if status != 200)
+    return {
+        "rps": total / elapsed,
+        "p50": np.percentile(latencies, 50),
+        "p99": np.percentile(latencies, 99),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the license web service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running server")
+    parser.add_argument("--requests", "-n", type=int, default=100, help="Requests per route")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the test track")
+    args = parser.parse_args()
+
+    # One key pair, license and stego file shared by every request
+    _, keys = request(f"{args.url}/generate_keys")
+    keys = json.loads(keys)
+    _, license_response = request(
+        f"{args.url}/generate_license",
+        json.dumps({"name": "Load Test", "email": "load@example.com", "private_key": keys["private_key"]}).encode(),
+        "application/json")
+    license_text = json.loads(license_response)["license"]
+
+    wav = make_wav(args.seconds)
+    embed_body, embed_type = multipart({"license": license_text}, {"audio": wav})
+    status, stego = request(f"{args.url}/embed_audio", embed_body, embed_type)
+    if status != 200:
+        raise SystemExit(f"Setup embed failed with HTTP {status}")
+    verify_body, verify_type = multipart({"public_key": keys["public_key"]}, {"audio": stego})
+
+    print(f"{args.requests} requests per route, concurrency {args.concurrency}, {len(wav) / 1e6:.1f} MB uploads")
+    print(f"{'route':<16} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, body, content_type in (("/embed_audio", embed_body, embed_type),
+                                      ("/verify_license", verify_body, verify_type)):
+        r = run(f"{args.url}{route}", body, content_type, args.requests, args.concurrency)
+        print(f"{route:<16} {r['rps']:>8.1f} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
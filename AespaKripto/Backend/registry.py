@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Issuance registry for the Digital License System
+Every issued license is appended to a SQLite file (WAL mode) indexed by
+license id, expiry date and customer email, so expiry and customer queries
+are answered from the index instead of by re-verifying stamped audio. Rows
+can't be updated or deleted.
+"""
+
+import json
+import sqlite3
+from datetime import date, timedelta
+from functools import lru_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS licenses (
+    seq INTEGER PRIMARY KEY,
+    license_id TEXT NOT NULL UNIQUE,
+    customer_name TEXT,
+    customer_email TEXT,
+    issue_date TEXT,
+    expiry_date TEXT,
+    type TEXT,
+    features TEXT,
+    key_id TEXT,
+    license TEXT
+);
+CREATE INDEX IF NOT EXISTS licenses_expiry ON licenses (expiry_date);
+CREATE INDEX IF NOT EXISTS licenses_customer ON licenses (customer_email, expiry_date);
+CREATE TRIGGER IF NOT EXISTS licenses_no_update BEFORE UPDATE ON licenses
+    BEGIN SELECT RAISE(ABORT, 'the license registry is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS licenses_no_delete BEFORE DELETE ON licenses
+    BEGIN SELECT RAISE(ABORT, 'the license registry is append-only'); END;
+"""
+
+COLUMNS = ("license_id", "customer_name", "customer_email", "issue_date", "expiry_date", "type", "features",
+           "key_id", "license")
+INSERT = f"INSERT INTO licenses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+BATCH_SIZE = 10000  # Rows per transaction when recording in bulk
+BUSY_TIMEOUT = 30  # Seconds a writer waits for another process's transaction
+
+
+@lru_cache(maxsize=None)
+def _connect(path):
+    """
+    One shared connection per registry file
+
+    Open it after forking: SQLite connections must not be shared between
+    processes.
+    """
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def _row(license_data, license_text=None, kid=None):
+    customer = license_data.get("customer", {})
+    email = customer.get("email")
+    return (license_data["license_id"], customer.get("name"), email and email.strip().lower(),
+            license_data.get("issue_date"), license_data.get("expiry_date"), license_data.get("type"),
+            json.dumps(license_data.get("features", [])), kid, license_text)
+
+
+def record_licenses(path, licenses):
+    """
+    Append issued licenses, BATCH_SIZE rows per transaction; returns the count
+
+    licenses yields (license dict, issued license text or None, key id hex or
+    None) tuples.
+    """
+    db = _connect(path)
+    count = 0
+    batch = []
+    for entry in licenses:
+        batch.append(_row(*entry))
+        if len(batch) == BATCH_SIZE:
+            with db:
+                db.executemany(INSERT, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        with db:
+            db.executemany(INSERT, batch)
+        count += len(batch)
+    return count
+
+
+def record_license(path, license_data, license_text=None, kid=None):
+    """Append one issued license"""
+    record_licenses(path, [(license_data, license_text, kid)])
+
+
+def _rows(cursor):
+    return [dict(row) for row in cursor]
+
+
+def find_license(path, license_id):
+    """The registry row of a license id, or None"""
+    rows = _rows(_connect(path).execute("SELECT * FROM licenses WHERE license_id = ?", (license_id.lower(),)))
+    return rows[0] if rows else None
+
+
+def expiring_between(path, start, end, limit=-1):
+    """Licenses expiring from start to end (inclusive ISO dates), soonest first"""
+    return _rows(_connect(path).execute(
+        "SELECT * FROM licenses WHERE expiry_date BETWEEN ? AND ? ORDER BY expiry_date LIMIT ?",
+        (start, end, limit)))
+
+
+def expiring_within(path, days, limit=-1):
+    """Licenses expiring in the next days days (from today), soonest first"""
+    today = date.today()
+    return expiring_between(path, today.isoformat(), (today + timedelta(days=days)).isoformat(), limit)
+
+
+def customer_licenses(path, email, limit=-1):
+    """Licenses issued to a customer email, by expiry date"""
+    return _rows(_connect(path).execute(
+        "SELECT * FROM licenses WHERE customer_email = ? ORDER BY expiry_date LIMIT ?",
+        (email.strip().lower(), limit)))
+
+
+# Test the functions if executed directly
+if __name__ == "__main__":
+    import os
+    import secrets
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "registry.db")
+        today = date.today()
+        licenses = [({"license_id": secrets.token_hex(8),
+                      "customer": {"name": f"Customer {i % 10}", "email": f"c{i % 10}@example.com"},
+                      "issue_date": today.isoformat(),
+                      "expiry_date": (today + timedelta(days=i)).isoformat(),
+                      "type": "standard", "features": []}, None, None) for i in range(100)]
+        assert record_licenses(path, licenses) == 100, "Registry insert failed"
+
+        assert len(expiring_within(path, 6)) == 7, "Expiry query failed"
+        assert len(customer_licenses(path, "C3@example.com")) == 10, "Customer query failed"
+        assert find_license(path, licenses[5][0]["license_id"])["expiry_date"] == licenses[5][0]["expiry_date"]
+        try:
+            _connect(path).execute("DELETE FROM licenses")
+            raise AssertionError("Registry rows could be deleted")
+        except sqlite3.DatabaseError:
+            pass
+        print("Registry test passed")
@@ -0,0 +1,303 @@
+"""
+Request handling shared by the WSGI (app.py) and ASGI (asgi.py) services
+Plain functions with picklable arguments, so the ASGI service can run them in
+worker processes
+"""
+
+import os
+import base64
+import json
+import secrets
+from datetime import datetime, timedelta
+from hashlib import sha256
+
+import numpy as np
+from scipy.fftpack import dct, idct
+
+from ecc_crypto import (generate_ecc_keypair, generate_ecc_keypairs, encrypt_ecc, encrypt_ecc_many, decrypt_ecc,
+                        sign_ecdsa, verify_ecdsa, batch_verify_ecdsa, get_backend, generator_table,
+                        public_key_point, start_ephemeral_pool)
+from audio_stego import embed_data_in_audio, extract_data_from_audio, read_audio, payload_frames, BLOCK_SIZE
+from uploads import UploadError, embed_capacity_bits, claim_upload
+from revocation import open_revocation_list, is_revoked
+from registry import record_license, record_licenses
+import store
+
+MAX_KEYGEN_COUNT = 10000
+MAX_BULK_LICENSES = 10000
+LICENSE_BATCH = 64  # Licenses encrypted (and streamed back) together
+SIGNATURE_WINDOW = 8  # Opened licenses of a bulk verify whose signatures are checked (and streamed back) together
+REVOCATION_LIST = os.environ.get("REVOCATION_LIST")  # Revocation list checked by verify, if set
+LICENSE_REGISTRY = os.environ.get("LICENSE_REGISTRY")  # Issuance registry recording every license, if set
+EPHEMERAL_POOL_SIZE = int(os.environ.get("ECC_EPHEMERAL_POOL", 256))  # Precomputed ephemeral keys per worker
+
+
+def warm_up(public_keys_file=None):
+    """
+    Build the shared crypto and DCT state up front
+
+    Run in the server master before workers fork (gunicorn preload) so the
+    state is built once and shared copy-on-write instead of per worker on
+    their first requests. public_keys_file optionally lists hex public keys,
+    one per line, to parse into the key cache. The revocation list is mapped
+    here too, so a missing list fails at startup. The ephemeral key pool is
+    set up, but each worker only starts filling it on its first license.
+    """
+    get_backend()
+    generator_table()
+    start_ephemeral_pool(EPHEMERAL_POOL_SIZE)
+
+    # scipy caches its FFT plans per transform size
+    block = np.zeros(BLOCK_SIZE)
+    idct(dct(block, norm='ortho'), norm='ortho')
+
+    if REVOCATION_LIST:
+        open_revocation_list(REVOCATION_LIST)
+
+    if public_keys_file:
+        with open(public_keys_file, "r") as f:
+            for line in f:
+                if line.strip():
+                    public_key_point(line.strip())
+
+
+def embed_preflight(fields, header):
+    """Reject tracks too short for the license before the upload completes"""
+    license_data = fields.get("license")
+    if license_data is None:
+        return
+    needed = len(license_data.encode("utf-8")) * 8
+    if needed > embed_capacity_bits(header["frames"]):
+        raise UploadError(f"Audio too short: {header['frames']} frames hold "
+                          f"{embed_capacity_bits(header['frames'])} bits, the license needs {needed}", 422)
+
+
+def verify_preflight(fields, header):
+    """Reject tracks too short to contain an embedded header"""
+    if header["frames"] < BLOCK_SIZE:
+        raise UploadError(f"Audio too short to carry a license ({header['frames']} frames)", 422)
+
+
+def keypair():
+    """One key pair as a response dict"""
+    private_key, public_key = generate_ecc_keypair()
+    return {"private_key": private_key, "public_key": public_key}
+
+
+def keypair_lines(count):
+    """count key pairs as NDJSON lines"""
+    return "".join(json.dumps({"private_key": private_key, "public_key": public_key}) + "\n"
+                   for private_key, public_key in generate_ecc_keypairs(count))
+
+
+def make_license(data):
+    """Build, sign and encrypt a license from a /generate_license request body"""
+    license_data = build_license(data)
+    sign_license(license_data, data["private_key"])
+    encrypted = encrypt_ecc(json.dumps(license_data), data["private_key"])
+    license_text = base64.b64encode(encrypted).decode()
+    if LICENSE_REGISTRY:
+        record_license(LICENSE_REGISTRY, license_data, license_text)
+    return license_text
+
+
+def make_licenses(items, first_index=0):
+    """
+    Build, sign and encrypt many licenses, batching the encryption per key
+
+    Returns one {"index", "license"} or {"index", "error"} dict per item. The
+    issued licenses are recorded in the registry in one transaction.
+    """
+    results = [None] * len(items)
+    licenses = [None] * len(items)
+    by_key = {}
+    for i, data in enumerate(items):
+        try:
+            licenses[i] = sign_license(build_license(data), data["private_key"])
+            by_key.setdefault(data["private_key"], []).append((i, json.dumps(licenses[i])))
+        except KeyError as e:
+            results[i] = {"index": first_index + i, "error": f"Invalid license request: missing {e}"}
+        except (TypeError, ValueError) as e:
+            results[i] = {"index": first_index + i, "error": f"Invalid license request: {e}"}
+
+    for private_key, entries in by_key.items():
+        try:
+            encrypted = encrypt_ecc_many([license_json for _, license_json in entries], private_key)
+        except (TypeError, ValueError) as e:
+            for i, _ in entries:
+                results[i] = {"index": first_index + i, "error": f"Encryption failed: {e}"}
+            continue
+        for (i, _), data in zip(entries, encrypted):
+            results[i] = {"index": first_index + i, "license": base64.b64encode(data).decode()}
+
+    if LICENSE_REGISTRY:
+        record_licenses(LICENSE_REGISTRY, [(licenses[i], result["license"], None)
+                                           for i, result in enumerate(results) if "license" in result])
+    return results
+
+
+def build_license(data):
+    """License dict (with its hash) for a /generate_license request body"""
+    customer_info = {
+        "name": data["name"],
+        "email": data["email"]
+    }
+    validity_days = data.get("days", 365)
+
+    issue_date = datetime.now()
+    expiry_date = issue_date + timedelta(days=int(validity_days))
+
+    license_data = {
+        "customer": customer_info,
+        "issue_date": issue_date.strftime("%Y-%m-%d"),
+        "expiry_date": expiry_date.strftime("%Y-%m-%d"),
+        "license_id": secrets.token_hex(8),
+        "type": "standard",
+        "features": data.get("features", []),
+    }
+
+    json_data = json.dumps(license_data, indent=2)
+    license_hash = sha256(json_data.encode()).hexdigest()
+    license_data["hash"] = license_hash
+
+    return license_data
+
+
+def sign_license(license_data, private_key):
+    """
+    Add the issuer's ECDSA signature to a license dict and return it
+
+    The signature covers the license (with its hash) as indented JSON, the
+    same message the Karina CLI signs and checks for JSON licenses.
+    """
+    license_data["signature"] = sign_ecdsa(json.dumps(license_data, indent=2), private_key).hex()
+    return license_data
+
+
+def claim_embed_upload(upload_id, license_data):
+    """Take a finished resumable upload for embedding; returns the WAV path"""
+    input_path, header = claim_upload(upload_id)
+    try:
+        embed_preflight({"license": license_data}, header)
+    except UploadError:
+        os.unlink(input_path)
+        raise
+    return input_path
+
+
+def embed_file(license_data, input_path):
+    """
+    Embed a license into an uploaded WAV; the caller deletes the upload
+
+    Returns the store key of the output, or None if embedding failed. An
+    output already stored for the same audio and license is reused as is.
+    """
+    key = store.output_key(input_path, license_data)
+    if store.lookup(key):
+        return key
+
+    output_path = store.temp_path()
+    try:
+        if not embed_data_in_audio(license_data, input_path, output_path):
+            return None
+        store.put(key, output_path)
+    finally:
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+    return key
+
+
+def open_file(audio_path, public_key, prefix=False):
+    """
+    Extract and decrypt the license of an uploaded WAV, without checking its signature
+
+    Returns (body, status, signed): on success body holds the license and
+    signed is its (message, signature) pair; otherwise signed is None. With
+    prefix set the upload is only the start of the track. If that is too
+    short for the payload its block 0 announces, the answer is 422 with the
+    frames_needed to send instead.
+    """
+    extracted = extract_data_from_audio(audio_path)
+    if not extracted:
+        if prefix:
+            _, _, audio_float = read_audio(audio_path)
+            needed = payload_frames(audio_float)
+            if needed and needed > len(audio_float):
+                return {"error": "Audio prefix too short for the license", "frames_needed": needed}, 422, None
+        return {"error": "Failed to extract data"}, 400, None
+
+    try:
+        encrypted = base64.b64decode(extracted)
+        decrypted_json = decrypt_ecc(encrypted, public_key)
+        data = json.loads(decrypted_json)
+
+        # The license key is public, so only the signature shows who issued it
+        signature = data.pop("signature", None)
+        if signature is None:
+            return {"error": "License is not signed"}, 403, None
+        return {"license": data}, 200, (json.dumps(data, indent=2), bytes.fromhex(signature))
+
+    except Exception as e:
+        return {"error": str(e)}, 500, None
+
+
+def check_revocation(body):
+    """(body, status) for an opened license with a valid signature"""
+    data = body["license"]
+    if REVOCATION_LIST and is_revoked(REVOCATION_LIST, str(data.get("license_id", ""))):
+        return {"error": "License revoked", "license_id": data["license_id"]}, 403
+    return body, 200
+
+
+def verify_file(audio_path, public_key, prefix=False):
+    """Extract, decrypt and check the license of an uploaded WAV and delete it; returns (body, status)"""
+    try:
+        body, status, signed = open_file(audio_path, public_key, prefix)
+    finally:
+        os.unlink(audio_path)
+    if signed is None:
+        return body, status
+    if not verify_ecdsa(*signed, public_key):
+        return {"error": "License signature verification failed"}, 403
+    return check_revocation(body)
+
+
+def verify_upload(index, entry, public_key):
+    """
+    Open one file of a bulk upload and delete it
+
+    Returns (result dict, signed); signed is the (message, signature) pair
+    to pass on to check_signatures, or None if result is already final.
+    """
+    result = {"index": index, "filename": entry["filename"]}
+    if entry["error"]:
+        result["error"] = entry["error"]
+        return result, None
+
+    try:
+        body, _, signed = open_file(entry["path"], public_key)
+    finally:
+        os.unlink(entry["path"])
+    result.update(body)
+    return result, signed
+
+
+def check_signatures(pending, public_key):
+    """
+    Finish a window of bulk verification results with one batch signature check
+
+    pending holds up to SIGNATURE_WINDOW (result, signed) pairs of
+    verify_upload with a signature. Files are only checked one by one if the
+    batch fails.
+    """
+    all_valid = batch_verify_ecdsa([(message, signature, public_key) for _, (message, signature) in pending])
+
+    results = []
+    for result, signed in pending:
+        base = {"index": result["index"], "filename": result["filename"]}
+        if not all_valid and not verify_ecdsa(*signed, public_key):
+            results.append({**base, "error": "License signature verification failed"})
+        else:
+            body, _ = check_revocation({"license": result["license"]})
+            results.append({**base, **body})
+    return results
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Shared read-only tables for the Digital License System
+Precomputed tables are built once, saved to a cache file and memory-mapped
+read-only as NumPy arrays, so every web worker and CLI process of a user
+reads one copy from the page cache instead of building and holding its own.
+The tables feed key generation and signing, so the cache directory must be
+private to the user and every table is checked against its known SHA-256.
+"""
+
+import os
+import stat
+import getpass
+import hashlib
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+TABLE_DIR = (os.environ.get("SHARED_TABLE_DIR")
+             or os.path.join(tempfile.gettempdir(), f"kripto_tables-{getpass.getuser()}"))
+
+
+def table_path(name, digest):
+    """Cache file of a table; its name carries the start of the content hash"""
+    return os.path.join(TABLE_DIR, f"{name}-{digest[:16]}.npy")
+
+
+def content_digest(table):
+    """SHA-256 (hex) of a table's contents"""
+    return hashlib.sha256(np.ascontiguousarray(table).data).hexdigest()
+
+
+def check_table_dir():
+    """
+    Create the cache directory if needed and make sure nobody else can write to it
+
+    Raises OSError unless it is a real directory owned by this user (or
+    root) without group or world write permission.
+    """
+    os.makedirs(TABLE_DIR, mode=0o700, exist_ok=True)
+    info = os.lstat(TABLE_DIR)
+    if not stat.S_ISDIR(info.st_mode):
+        raise OSError(f"{TABLE_DIR} is not a directory")
+    if hasattr(os, "getuid") and info.st_uid not in (os.getuid(), 0):
+        raise OSError(f"{TABLE_DIR} belongs to another user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise OSError(f"{TABLE_DIR} is writable by other users")
+
+
+def _build(name, build, digest):
+    """Build a table privately and check it against its digest"""
+    table = build()
+    if content_digest(table) != digest:
+        raise ValueError(f"Table {name} doesn't match its expected SHA-256")
+    table.flags.writeable = False
+    return table
+
+
+def _publish(path, table):
+    """Write a table next to its final path and rename it into place"""
+    fd, temp_path = tempfile.mkstemp(dir=TABLE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(table))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+@lru_cache(maxsize=None)
+def shared_table(name, build, digest):
+    """
+    Read-only array view of a shared table, calling build() if no process has yet
+
+    digest is the SHA-256 (hex) of the table's contents. A cache file that
+    doesn't match it (damaged, stale or planted) is rebuilt instead of used.
+    If the cache directory is unsafe or can't be written, the table is built
+    privately for this process.
+    """
+    try:
+        check_table_dir()
+    except OSError as e:
+        print(f"Warning: not sharing table {name}: {e}")
+        return _build(name, build, digest)
+
+    path = table_path(name, digest)
+    try:
+        table = np.load(path, mmap_mode="r")
+        if content_digest(table) == digest:
+            return table
+    except (OSError, ValueError):
+        pass  # Not built yet, or a damaged file to replace
+
+    table = _build(name, build, digest)
+    try:
+        _publish(path, table)
+    except OSError as e:
+        print(f"Warning: could not share table {name} in {TABLE_DIR}: {e}")
+        return table
+    return np.load(path, mmap_mode="r")
+
+
+if __name__ == "__main__":
+    calls = []
+
+    def build():
+        calls.append(1)
+        return np.arange(1000, dtype=np.float64)
+
+    expected = np.arange(1000, dtype=np.float64)
+    digest = content_digest(expected)
+    with tempfile.TemporaryDirectory() as workdir:
+        TABLE_DIR = os.path.join(workdir, "tables")
+        table = shared_table("test_table", build, digest)
+        shared_table.cache_clear()
+        again = shared_table("test_table", build, digest)
+
+        assert np.array_equal(table, expected) and np.array_equal(again, expected) and len(calls) == 1, "Table was rebuilt"
+        assert isinstance(again, np.memmap) and not again.flags.writeable, "Table is not a read-only map"
+
+        # A planted table is replaced, and a directory others can write to is not used
+        np.save(table_path("test_table", digest), np.zeros(1000))
+        shared_table.cache_clear()
+        assert np.array_equal(shared_table("test_table", build, digest), expected), "Planted table was used"
+        os.chmod(TABLE_DIR, 0o777)
+        shared_table.cache_clear()
+        unshared = shared_table("test_table", build, digest)
+        assert not isinstance(unshared, np.memmap) and np.array_equal(unshared, expected), "Unsafe directory was used"
+        print("Shared table test passed")
@@ -0,0 +1,92 @@
+"""
+Content-addressed store for stego outputs
+Each output is kept under the hash of (input audio, license, engine version),
+so retried downloads and repeated stamping of the same pair are served from
+disk without re-embedding. The store is size-capped and evicts the least
+recently used outputs. Outputs are written to temporary files inside the
+store and published with an atomic rename, so worker processes can share one
+store directory.
+"""
+
+import os
+import hashlib
+import tempfile
+
+from audio_stego import FORMAT_VERSION
+
+STORE_DIR = os.environ.get("STEGO_STORE_DIR") or os.path.join(tempfile.gettempdir(), "stego_store")
+STORE_MAX_BYTES = int(os.environ.get("STEGO_STORE_MB", 2048)) * 1024 * 1024
+ENGINE_VERSION = f"audio_stego/v{FORMAT_VERSION}"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def output_key(input_path, license_data):
+    """Hex content hash identifying the output of embedding license_data into input_path"""
+    digest = hashlib.sha256()
+    with open(input_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    input_hash = digest.hexdigest()
+
+    key = hashlib.sha256()
+    for part in (input_hash, license_data, ENGINE_VERSION):
+        key.update(part.encode("utf-8") + b"\0")
+    return key.hexdigest()
+
+
+def output_path(key):
+    """Store path of an output (whether or not it exists)"""
+    if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+        raise ValueError("Invalid output key")
+    return os.path.join(STORE_DIR, f"{key}.wav")
+
+
+def lookup(key):
+    """Path of a stored output, marked as recently used, or None"""
+    try:
+        path = output_path(key)
+        os.utime(path)
+    except (ValueError, FileNotFoundError):
+        return None
+    return path
+
+
+def temp_path():
+    """New empty temporary file inside the store to write an output to before put()"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=STORE_DIR, suffix=".tmp")
+    os.close(fd)
+    return path
+
+
+def put(key, path):
+    """Move a finished output (a temp_path() file) into the store, evict old ones and return its store path"""
+    target = output_path(key)
+    os.replace(path, target)
+    evict(keep=target)
+    return target
+
+
+def evict(keep=None, max_bytes=STORE_MAX_BYTES):
+    """Remove the least recently used outputs until the store fits in max_bytes"""
+    entries = []
+    for entry in os.scandir(STORE_DIR):
+        if not entry.name.endswith(".wav"):
+            continue  # An output still being written
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue  # Evicted by another worker meanwhile
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,394 @@
+"""
+Streaming upload handling for the license web service
+Parses multipart bodies incrementally and checks the WAV header as soon as it
+arrives, so unusable uploads are rejected before the rest of the body is read.
+Large files can also be sent as a resumable upload: chunks are appended to a
+file on disk at the offset the client names, so an interrupted transfer
+continues where it stopped.
+"""
+
+import os
+import json
+import time
+import fcntl
+import struct
+import secrets
+import tempfile
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
+
+from audio_stego import payload_capacity_bits
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", 200)) * 1024 * 1024
+MAX_FIELD_BYTES = 1024 * 1024  # Limit for the non-file form fields
+MAX_HEADER_BYTES = 1024 * 1024  # Give up if the data chunk hasn't started by then
+CHUNK_SIZE = 64 * 1024
+MAX_FILES = 100  # Audio parts accepted by one bulk request
+UPLOAD_DIR = os.environ.get("STEGO_UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "stego_uploads")
+UPLOAD_TTL = 24 * 3600  # Seconds an unfinished resumable upload is kept
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format tag, bits per sample) pairs the audio reader understands
+SUPPORTED_FORMATS = {
+    (WAVE_FORMAT_PCM, 8), (WAVE_FORMAT_PCM, 16), (WAVE_FORMAT_PCM, 24), (WAVE_FORMAT_PCM, 32),
+    (WAVE_FORMAT_IEEE_FLOAT, 32), (WAVE_FORMAT_IEEE_FLOAT, 64),
+}
+
+
+class UploadError(Exception):
+    """A rejected upload, with the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_wav_header(data, complete=False):
+    """
+    Parse the RIFF/WAVE header at the start of data
+
+    Returns a dict with the sample format and frame count, or None if more
+    bytes are needed (unless complete is set). Raises UploadError for files
+    that are not usable WAVs.
+    """
+    if len(data) < 12:
+        if complete:
+            raise UploadError("Not a WAV file", 415)
+        return None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise UploadError("Not a WAV file (missing RIFF/WAVE header)", 415)
+
+    info = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+
+        if chunk_id == b"fmt ":
+            if offset + 8 + size > len(data):
+                break
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", data, offset + 8)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and size >= 40:
+                # The real format tag starts the sub-format GUID
+                format_tag = struct.unpack_from("<H", data, offset + 32)[0]
+            if (format_tag, bits) not in SUPPORTED_FORMATS or not channels or not block_align:
+                raise UploadError(f"Unsupported WAV sample format (tag {format_tag}, {bits} bits)", 415)
+            info = {"format_tag": format_tag, "channels": channels, "sample_rate": sample_rate,
+                    "bits": bits, "block_align": block_align}
+
+        elif chunk_id == b"data":
+            if info is None:
+                raise UploadError("WAV data chunk comes before its format chunk", 415)
+            info["data_bytes"] = size
+            info["frames"] = size // info["block_align"]
+            return info
+
+        offset += 8 + size + (size & 1)
+
+    if complete:
+        raise UploadError("WAV file has no audio data", 415)
+    return None
+
+
+def embed_capacity_bits(frames):
+    """Payload bits a track of this many frames can carry (block 0 is the header)"""
+    return payload_capacity_bits(frames)
+
+
+class UploadParser:
+    """
+    Incremental multipart parser that saves file_field parts to temporary WAVs
+
+    Feed it the body chunk by chunk (None at the end). preflight(fields,
+    header) is called as soon as the WAV header of a file has arrived, with
+    the form fields received so far; it raises UploadError to stop the upload.
+    For a single file it runs again at the end if more fields arrived after
+    the file.
+
+    With multiple set, every file_field part is kept (up to MAX_FILES) and a
+    bad file doesn't stop the upload: its entry in files gets an error instead
+    of a path.
+    """
+
+    def __init__(self, content_type, file_field, preflight=None, multiple=False):
+        mimetype, options = parse_options_header(content_type)
+        if mimetype != "multipart/form-data" or not options.get("boundary"):
+            raise UploadError("Expected a multipart/form-data upload")
+
+        self.decoder = MultipartDecoder(options["boundary"].encode(), max_form_memory_size=MAX_FIELD_BYTES)
+        self.file_field = file_field
+        self.preflight = preflight
+        self.multiple = multiple
+        self.fields = {}
+        self.files = []  # {"filename", "path", "error"} per file part
+        self.path = None
+        self.done = False
+        self._current = None
+        self._value = bytearray()
+        self._output = None
+        self._header = None
+        self._header_buffer = bytearray()
+        self._checked_fields = None
+
+    def feed(self, chunk):
+        """Process the next body chunk; returns True once the body is complete"""
+        try:
+            self.decoder.receive_data(chunk or None)
+            self._process_events()
+            if self.done:
+                self._finish()
+        except BaseException as e:
+            self.abort()
+            if isinstance(e, ValueError):
+                # The decoder raises ValueError for malformed or truncated bodies
+                raise UploadError(f"Malformed upload: {e}")
+            raise
+        return self.done
+
+    def abort(self):
+        """Remove every file written so far"""
+        self._discard_part()
+        for entry in self.files:
+            if entry["path"]:
+                os.unlink(entry["path"])
+                entry["path"] = None
+
+    def _discard_part(self):
+        if self._output is not None:
+            self._output.close()
+            os.unlink(self._output.name)
+            self._output = None
+
+    def _process_events(self):
+        while True:
+            event = self.decoder.next_event()
+
+            if isinstance(event, NeedData):
+                return
+
+            if isinstance(event, Epilogue):
+                self.done = True
+                return
+
+            if isinstance(event, Field):
+                self._current = event.name
+                self._value = bytearray()
+
+            elif isinstance(event, File):
+                self._current = None
+                if event.name == self.file_field and (self.multiple or not self.files):
+                    if len(self.files) >= MAX_FILES:
+                        raise UploadError(f"At most {MAX_FILES} files per request", 413)
+                    self._current = self.file_field
+                    self._output = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+                    self._header = None
+                    self._header_buffer = bytearray()
+                    self.files.append({"filename": event.filename, "path": None, "error": None})
+
+            elif isinstance(event, Data):
+                if self._current == self.file_field:
+                    self._file_data(event)
+                elif self._current is not None:
+                    self._value += event.data
+                    if not event.more_data:
+                        self.fields[self._current] = self._value.decode("utf-8")
+
+    def _file_data(self, event):
+        try:
+            self._output.write(event.data)
+            if self._header is None:
+                self._check_header(event.data, complete=not event.more_data)
+        except UploadError as e:
+            if not self.multiple:
+                raise
+            # Skip the rest of this file, keep the others
+            self._discard_part()
+            self.files[-1]["error"] = str(e)
+            self._current = None
+            return
+
+        if not event.more_data:
+            self._output.close()
+            self.files[-1]["path"] = self._output.name
+            self._output = None
+
+    def _check_header(self, data, complete):
+        self._header_buffer += data
+        self._header = parse_wav_header(self._header_buffer, complete)
+        if self._header is None:
+            if len(self._header_buffer) > MAX_HEADER_BYTES:
+                raise UploadError("WAV header too large", 415)
+        elif self.preflight:
+            self.preflight(self.fields, self._header)
+            self._checked_fields = dict(self.fields)
+
+    def _finish(self):
+        if not self.files:
+            raise UploadError(f"Missing '{self.file_field}' file")
+        for entry in self.files:
+            if entry["path"] is None and entry["error"] is None:
+                if not self.multiple:
+                    raise UploadError("Empty audio file", 415)
+                entry["error"] = "Empty audio file"
+        if not self.multiple:
+            if self.preflight and self.fields != self._checked_fields:
+                self.preflight(self.fields, self._header)
+            self.path = self.files[0]["path"]
+
+
+def receive_upload(request, file_field, preflight=None, multiple=False):
+    """
+    Read a multipart WSGI request, saving file_field to a temporary WAV file
+
+    Returns (fields, path of the saved file), or (fields, file entries) with
+    multiple set; see UploadParser for preflight.
+    """
+    parser = UploadParser(request.headers.get("Content-Type", ""), file_field, preflight, multiple)
+    stream = request.stream
+    while not parser.feed(stream.read(CHUNK_SIZE)):
+        pass
+    return parser.fields, parser.files if multiple else parser.path
+
+
+def _upload_paths(upload_id):
+    """(data, metadata) paths of a resumable upload"""
+    if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+        raise UploadError("Upload not found", 404)
+    base = os.path.join(UPLOAD_DIR, upload_id)
+    return f"{base}.part", f"{base}.json"
+
+
+def expire_uploads(max_age=UPLOAD_TTL):
+    """Remove resumable uploads untouched for max_age seconds"""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(UPLOAD_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass  # Finished or expired by another worker meanwhile
+
+
+def create_upload(size):
+    """Start a resumable upload of size bytes; returns its status"""
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("Expected the upload size in bytes")
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadError(f"Upload exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit", 413)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    expire_uploads()
+    upload_id = secrets.token_hex(16)
+    data_path, meta_path = _upload_paths(upload_id)
+    with open(meta_path, "w") as f:
+        json.dump({"size": size}, f)
+    open(data_path, "wb").close()
+    return upload_status(upload_id)
+
+
+def upload_status(upload_id):
+    """{"upload_id", "offset", "size"} of a resumable upload; offset is the next byte expected"""
+    data_path, meta_path = _upload_paths(upload_id)
+    try:
+        with open(meta_path, "r") as f:
+            size = json.load(f)["size"]
+        offset = os.path.getsize(data_path)
+    except FileNotFoundError:
+        raise UploadError("Upload not found", 404)
+    return {"upload_id": upload_id, "offset": offset, "size": size}
+
+
+def discard_upload(upload_id):
+    """Remove a resumable upload"""
+    for path in _upload_paths(upload_id):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class ChunkWriter:
+    """
+    Append one chunk of a resumable upload as its request body streams in
+
+    The chunk must start at the upload's current offset, and only one chunk
+    of an upload is written at a time. Whatever arrived before a dropped
+    connection is kept, so the client resumes from the offset it reads back.
+    """
+
+    def __init__(self, upload_id, offset):
+        if offset is None:
+            raise UploadError("Missing chunk offset (Upload-Offset header)")
+        self.upload_id = upload_id
+        status = upload_status(upload_id)
+        self.size = status["size"]
+
+        self.file = open(_upload_paths(upload_id)[0], "ab")
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise UploadError("Another chunk of this upload is being written", 409)
+
+        self.start = self.offset = os.fstat(self.file.fileno()).st_size
+        if offset != self.offset:
+            self.file.close()
+            raise UploadError(f"Chunk starts at {offset}, but the upload continues at {self.offset}", 409)
+
+    def feed(self, data):
+        if self.offset + len(data) > self.size:
+            raise UploadError("Chunk runs past the announced upload size", 413)
+        self.file.write(data)
+        self.offset += len(data)
+
+    def close(self):
+        """
+        Finish the chunk and return the upload status
+
+        The WAV header is checked once it has arrived; an upload that isn't a
+        usable WAV is discarded.
+        """
+        self.file.close()
+        if self.start < MAX_HEADER_BYTES and self.offset > self.start:
+            try:
+                upload_header(self.upload_id, complete=self.offset >= min(self.size, MAX_HEADER_BYTES))
+            except UploadError:
+                discard_upload(self.upload_id)
+                raise
+        return upload_status(self.upload_id)
+
+
+def upload_header(upload_id, complete=True):
+    """Parsed WAV header of a resumable upload (None if more bytes are needed)"""
+    with open(_upload_paths(upload_id)[0], "rb") as f:
+        return parse_wav_header(f.read(MAX_HEADER_BYTES), complete)
+
+
+def claim_upload(upload_id):
+    """
+    Take a finished resumable upload for processing
+
+    Returns (path of the assembled WAV, its header). The data is renamed, so
+    the upload is processed only once; the caller deletes the file.
+    """
+    status = upload_status(upload_id)
+    if status["offset"] < status["size"]:
+        raise UploadError(f"Upload incomplete: {status['offset']} of {status['size']} bytes received", 409)
+
+    data_path, meta_path = _upload_paths(upload_id)
+    path = os.path.join(UPLOAD_DIR, f"{upload_id}.wav")
+    try:
+        os.replace(data_path, path)
+    except FileNotFoundError:
+        raise UploadError("Upload not found", 404)
+    os.unlink(meta_path)
+
+    try:
+        with open(path, "rb") as f:
+            return path, parse_wav_header(f.read(MAX_HEADER_BYTES), complete=True)
+    except UploadError:
+        os.unlink(path)
+        raise
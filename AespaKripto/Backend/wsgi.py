@@ -0,0 +1,11 @@
+"""WSGI entry point for production servers (see gunicorn.conf.py)"""
+
+import os
+
+from app import create_app
+from service import warm_up
+
+app = create_app()
+
+# With gunicorn's preload_app this runs once in the master, before forking
+warm_up(os.environ.get("PRELOAD_PUBLIC_KEYS"))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Cross-backend checks and benchmark for ecc_crypto
+Verifies that the pure-Python and OpenSSL backends are interchangeable (keys,
+ciphertexts and shared points) and reports operations per second for each
+"""
+
+import sys
+import time
+import secrets
+import argparse
+
+import ecc_crypto
+from ecc_crypto import (BACKENDS, CURVE_N, set_backend, generate_ecc_keypair, sign_ecdsa, start_ephemeral_pool,
+                        stop_ephemeral_pool, encrypt_ecc, decrypt_ecc, encrypt_ecc_bytes, decrypt_ecc_bytes)
+
+POOL_SIZE = 256
+
+
+def available_backends():
+    """Names of the backends usable in this environment"""
+    return [name for name in BACKENDS if name == "python" or ecc_crypto.ec is not None]
+
+
+def check_pair(first, second, rounds):
+    """Check that keys and ciphertexts made by one backend work with the other"""
+    a, b = BACKENDS[first](), BACKENDS[second]()
+    
+    for _ in range(rounds):
+        # Raw arithmetic must agree point for point
+        k = secrets.randbelow(CURVE_N - 1) + 1
+        point = a.base_mult(secrets.randbelow(CURVE_N - 1) + 1)
+        assert a.base_mult(k) == b.base_mult(k), "base_mult differs"
+        assert a.point_mult(k, point) == b.point_mult(k, point), "point_mult differs"
+        
+        # Keys from one backend, encryption with it, decryption with the other
+        set_backend(first)
+        private_key, public_key = generate_ecc_keypair()
+        message = secrets.token_bytes(secrets.randbelow(200) + 1)
+        text = secrets.token_hex(secrets.randbelow(100) + 1)
+        ciphertext = encrypt_ecc_bytes(message, private_key)
+        text_ciphertext = encrypt_ecc(text, private_key)
+        
+        set_backend(second)
+        assert decrypt_ecc_bytes(ciphertext, public_key) == message, "binary round trip failed"
+        assert decrypt_ecc(text_ciphertext, public_key) == text, "text round trip failed"
+
+
+def ops_per_second(func, seconds):
+    """Call func repeatedly for about seconds and return the call rate"""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def benchmark(name, seconds):
+    """Measure keygen, encrypt and decrypt throughput of one backend"""
+    set_backend(name)
+    private_key, public_key = generate_ecc_keypair()
+    message = secrets.token_bytes(64)
+    ciphertext = encrypt_ecc_bytes(message, private_key)
+    
+    return {
+        "keygen": ops_per_second(generate_ecc_keypair, seconds),
+        "encrypt": ops_per_second(lambda: encrypt_ecc_bytes(message, private_key), seconds),
+        "decrypt": ops_per_second(lambda: decrypt_ecc_bytes(ciphertext, public_key), seconds),
+    }
+
+
+def issue_latency(name, pooled, requests, gap):
+    """
+    p50 and p99 milliseconds of issuing a license (encrypt + sign), with or
+    without the ephemeral key pool, for requests spaced gap seconds apart
+    """
+    set_backend(name)
+    private_key, _ = generate_ecc_keypair()
+    message = secrets.token_bytes(32)
+    if pooled:
+        start_ephemeral_pool(POOL_SIZE).wait_full()
+    
+    latencies = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            encrypt_ecc_bytes(message, private_key)
+            sign_ecdsa(message, private_key)
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(gap)
+    finally:
+        stop_ephemeral_pool()
+    
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the ECC backends")
+    parser.add_argument("--rounds", type=int, default=25, help="Random cases per backend pair")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Time spent per benchmarked operation")
+    parser.add_argument("--requests", type=int, default=200, help="Licenses issued per latency measurement")
+    parser.add_argument("--gap", type=float, default=0.01, help="Idle seconds between issued licenses")
+    args = parser.parse_args()
+    
+    names = available_backends()
+    if len(names) < 2:
+        print("Note: 'cryptography' is not installed, only the python backend is checked")
+    
+    for first in names:
+        for second in names:
+            try:
+                check_pair(first, second, args.rounds)
+            except AssertionError as e:
+                print(f"FAIL {first} -> {second}: {e}")
+                sys.exit(1)
+            print(f"OK   {first} -> {second} ({args.rounds} random cases)")
+    
+    print(f"\n{'backend':<8} {'keygen/s':>10} {'encrypt/s':>10} {'decrypt/s':>10}")
+    results = {}
+    for name in names:
+        results[name] = benchmark(name, args.seconds)
+        r = results[name]
+        print(f"{name:<8} {r['keygen']:>10.0f} {r['encrypt']:>10.0f} {r['decrypt']:>10.0f}")
+    
+    if "openssl" in results:
+        speedups = [results["openssl"][op] / results["python"][op] for op in ("keygen", "encrypt", "decrypt")]
+        print(f"openssl speedup: keygen {speedups[0]:.1f}x, encrypt {speedups[1]:.1f}x, decrypt {speedups[2]:.1f}x")
+    
+    print(f"\nLicense issue latency (encrypt + sign, {args.requests} requests {args.gap * 1000:.0f} ms apart)")
+    print(f"{'backend':<8} {'pool':<6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name in names:
+        for pooled in (False, True):
+            p50, p99 = issue_latency(name, pooled, args.requests, args.gap)
+            print(f"{name:<8} {'on' if pooled else 'off':<6} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
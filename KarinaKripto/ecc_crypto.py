@@ -1,31 +1,88 @@
 #!/usr/bin/env python3
 """
 ECC Cryptography module for the Digital License System
-Handles key generation, encryption, and decryption using Elliptic Curve Cryptography
+Handles key generation, encryption, decryption and ECDSA signatures using Elliptic Curve Cryptography
 """
 
 import os
 import secrets
 import hashlib
+import threading
+from collections import deque
+from functools import lru_cache
 from tinyec import registry
+from tinyec.ec import Point
 import base64
+import numpy as np
+
+from shared_tables import shared_table
+
+# Optional OpenSSL-backed arithmetic; used automatically when installed
+try:
+    from cryptography.hazmat.primitives.asymmetric import ec
+except ImportError:
+    ec = None
+
+# Curve parameters for the fast arithmetic below (secp256r1 / NIST P-256)
+CURVE = registry.get_curve('secp256r1')
+CURVE_P = CURVE.field.p
+CURVE_N = CURVE.field.n
+CURVE_A = CURVE.a
+CURVE_B = CURVE.b
+GENERATOR = (CURVE.g.x, CURVE.g.y, 1)
+
+SIGNATURE_BYTES = 65  # r || s || parity of R.y
+MSM_WINDOW = 4  # Window width (bits) of the multi-scalar multiplication
+FIXED_BASE_WINDOW = 8  # Window width (bits) of the precomputed generator table
+GENERATOR_TABLE_SHA256 = "b7344c6ee694e70286ba32a07719ffa847d32f9136f37d735cef6315c12653d7"  # For this window
+COORD_BYTES = 32
+KEYGEN_BATCH = 256  # Key pairs normalized to affine together in bulk generation
+BATCH_WEIGHT_BITS = 128  # Size of the random weights in batch verification
+
+# Backend used when none is forced: "auto", "python" or "openssl"
+ECC_BACKEND = os.environ.get("ECC_BACKEND", "auto")
+EPHEMERAL_POOL_SIZE = int(os.environ.get("ECC_EPHEMERAL_POOL", 0))  # 0: no pool until one is started
+EPHEMERAL_LOW_WATER = os.environ.get("ECC_EPHEMERAL_LOW_WATER")  # Refill threshold (default: a quarter)
+
 
 def generate_ecc_keypair():
     """Generate an ECC key pair"""
-    # Use the SECP256R1 curve (also known as NIST P-256)
-    curve = registry.get_curve('secp256r1')
-    
     # Generate private key
-    private_key = secrets.randbelow(curve.field.n)
+    private_key = secrets.randbelow(CURVE_N - 1) + 1
     
     # Generate public key
-    public_key = private_key * curve.g
+    public_key = get_backend().base_mult(private_key)
+    
+    return _format_keypair(private_key, public_key)
+
+
+def generate_ecc_keypairs(count):
+    """
+    Generate count ECC key pairs, yielding them as they are made
     
+    Keys are produced in batches of KEYGEN_BATCH that share the generator
+    table and a single modular inversion, so large runs can be streamed.
+    """
+    backend = get_backend()
+    for start in range(0, count, KEYGEN_BATCH):
+        private_keys = [secrets.randbelow(CURVE_N - 1) + 1 for _ in range(min(KEYGEN_BATCH, count - start))]
+        for private_key, public_key in zip(private_keys, backend.base_mult_many(private_keys)):
+            yield _format_keypair(private_key, public_key)
+
+
+def derive_public_key(private_key_hex):
+    """Hex public key belonging to a hex private key"""
+    private_key = int(private_key_hex, 16)
+    return _format_keypair(private_key, get_backend().base_mult(private_key))[1]
+
+
+def _format_keypair(private_key, public_key):
+    """Hex strings for a private scalar and its affine (x, y) public point"""
     # Format private key
     private_key_str = hex(private_key)[2:]
     
     # Format public key
-    public_key_str = f"04{hex(public_key.x)[2:].zfill(64)}{hex(public_key.y)[2:].zfill(64)}"
+    public_key_str = f"04{hex(public_key[0])[2:].zfill(64)}{hex(public_key[1])[2:].zfill(64)}"
     
     return private_key_str, public_key_str
 
@@ -44,7 +101,67 @@ def point_from_hex(curve, hex_string):
     x = int(x_hex, 16)
     y = int(y_hex, 16)
     
-    return curve.point(x, y)
+    return Point(curve, x, y)
+
+
+def point_to_bytes(point):
+    """Encode a curve point as 65 raw bytes (uncompressed format)"""
+    return b"\x04" + point.x.to_bytes(32, "big") + point.y.to_bytes(32, "big")
+
+
+def point_from_bytes(curve, data):
+    """Decode a 65-byte uncompressed point"""
+    if len(data) != 65 or data[0] != 4:
+        raise ValueError("Invalid point encoding")
+    return Point(curve, int.from_bytes(data[1:33], "big"), int.from_bytes(data[33:], "big"))
+
+
+def xor_with_secret(data, shared_secret):
+    """XOR data with the repeated shared secret (symmetric)"""
+    return bytes(byte ^ shared_secret[i % len(shared_secret)] for i, byte in enumerate(data))
+
+
+def _shared_secret(shared_point):
+    x, y = shared_point
+    return hashlib.sha256(f"{x},{y}".encode()).digest()
+
+
+def _encryption_secret(private_key_hex):
+    """Generate an ephemeral key pair and the shared secret for encryption"""
+    return _encryption_secrets(private_key_hex, 1)[0]
+
+
+def _encryption_secrets(private_key_hex, count):
+    """
+    Generate count ephemeral key pairs and shared secrets for encryption
+    
+    The point multiplications of all of them are done as two batches, so the
+    backend can share work (one affine normalization per batch).
+    """
+    backend = get_backend()
+    
+    # Convert private key from hex
+    private_key = int(private_key_hex, 16)
+    
+    # Ephemeral key pairs, precomputed when the pool has them
+    eph_public_keys = [Point(CURVE, *point) for _, point in ephemeral_keys(count)]
+    
+    # Calculate shared secrets the same way the public key holder will:
+    # eph.x * public_key, where public_key = private_key * G
+    shared_points = backend.base_mult_many([eph.x * private_key % CURVE_N for eph in eph_public_keys])
+    
+    return [(eph, _shared_secret(point)) for eph, point in zip(eph_public_keys, shared_points)]
+
+
+def _decryption_secret(eph_public_key, public_key_hex):
+    """Derive the shared secret for decryption from the ephemeral public key"""
+    # Convert public key to point
+    public_key = point_from_hex(CURVE, public_key_hex)
+    
+    # Calculate shared secret
+    # Use x-coordinate as scalar for simplicity
+    shared_point = get_backend().point_mult(eph_public_key.x % CURVE_N, (public_key.x, public_key.y))
+    return _shared_secret(shared_point)
 
 
 def encrypt_ecc(message, private_key_hex):
@@ -59,33 +176,39 @@ def encrypt_ecc(message, private_key_hex):
     # Convert message to bytes
     message_bytes = message.encode('utf-8')
     
-    # Get the curve
-    curve = registry.get_curve('secp256r1')
-    
-    # Convert private key from hex
-    private_key = int(private_key_hex, 16)
-    
-    # Generate ephemeral key pair
-    eph_private_key = secrets.randbelow(curve.field.n)
-    eph_public_key = eph_private_key * curve.g
-    
-    # Calculate shared secret
-    shared_point = private_key * eph_public_key
-    shared_secret = hashlib.sha256(f"{shared_point.x},{shared_point.y}".encode()).digest()
+    eph_public_key, shared_secret = _encryption_secret(private_key_hex)
     
     # XOR encryption (for simplicity)
     # In a production system, use AES or another strong cipher
-    encrypted = bytearray()
-    for i, byte in enumerate(message_bytes):
-        encrypted.append(byte ^ shared_secret[i % len(shared_secret)])
+    encrypted = xor_with_secret(message_bytes, shared_secret)
     
+    return _ciphertext(eph_public_key, encrypted)
+
+
+def encrypt_ecc_many(messages, private_key_hex):
+    """Encrypt many messages like encrypt_ecc, batching the curve operations"""
+    secrets_list = _encryption_secrets(private_key_hex, len(messages))
+    return [_ciphertext(eph_public_key, xor_with_secret(message.encode('utf-8'), shared_secret))
+            for message, (eph_public_key, shared_secret) in zip(messages, secrets_list)]
+
+
+def _ciphertext(eph_public_key, encrypted):
     # Encode ephemeral public key
     eph_public_key_hex = f"04{hex(eph_public_key.x)[2:].zfill(64)}{hex(eph_public_key.y)[2:].zfill(64)}"
     
     # Combine ephemeral public key and encrypted message
-    result = eph_public_key_hex.encode() + b':' + bytes(encrypted)
+    return eph_public_key_hex.encode() + b':' + encrypted
+
+
+def encrypt_ecc_bytes(message_bytes, private_key_hex):
+    """
+    Encrypt raw bytes using ECC
     
-    return result
+    Same scheme as encrypt_ecc, but the result is the raw 65-byte ephemeral
+    public key followed by the ciphertext, with no hex or separator.
+    """
+    eph_public_key, shared_secret = _encryption_secret(private_key_hex)
+    return point_to_bytes(eph_public_key) + xor_with_secret(message_bytes, shared_secret)
 
 
 def decrypt_ecc(encrypted_data, public_key_hex):
@@ -97,32 +220,528 @@ def decrypt_ecc(encrypted_data, public_key_hex):
     # Get the curve
     curve = registry.get_curve('secp256r1')
     
-    # Split the data
-    parts = encrypted_data.split(b':')
+    # Split the data (the ciphertext itself may contain b':')
+    parts = encrypted_data.split(b':', 1)
     if len(parts) != 2:
         raise ValueError("Invalid encrypted data format")
     
     eph_public_key_hex = parts[0].decode()
     encrypted_message = parts[1]
     
-    # Convert public key to point
-    public_key = point_from_hex(curve, public_key_hex)
-    
     # Convert ephemeral public key to point
     eph_public_key = point_from_hex(curve, eph_public_key_hex)
     
-    # Calculate shared secret
-    shared_point = public_key * int(eph_public_key_hex[2:66], 16)  # Use x-coordinate as scalar for simplicity
-    shared_secret = hashlib.sha256(f"{shared_point.x},{shared_point.y}".encode()).digest()
+    shared_secret = _decryption_secret(eph_public_key, public_key_hex)
     
     # XOR decryption
-    decrypted = bytearray()
-    for i, byte in enumerate(encrypted_message):
-        decrypted.append(byte ^ shared_secret[i % len(shared_secret)])
+    decrypted = xor_with_secret(encrypted_message, shared_secret)
     
     return decrypted.decode('utf-8')
 
 
+def decrypt_ecc_bytes(encrypted_data, public_key_hex):
+    """Decrypt raw bytes produced by encrypt_ecc_bytes"""
+    curve = registry.get_curve('secp256r1')
+    eph_public_key = point_from_bytes(curve, encrypted_data[:65])
+    shared_secret = _decryption_secret(eph_public_key, public_key_hex)
+    return xor_with_secret(encrypted_data[65:], shared_secret)
+
+
+# Point arithmetic in Jacobian coordinates: (X, Y, Z) is the affine point
+# (X/Z^2, Y/Z^3) and None is the point at infinity. This avoids a modular
+# inversion per addition, which is what makes tinyec's affine points slow.
+
+def _jacobian_double(point):
+    if point is None:
+        return None
+    x, y, z = point
+    if y == 0:
+        return None
+    
+    yy = y * y % CURVE_P
+    s = 4 * x * yy % CURVE_P
+    zz = z * z % CURVE_P
+    m = (3 * x * x + CURVE_A * zz * zz) % CURVE_P
+    x3 = (m * m - 2 * s) % CURVE_P
+    y3 = (m * (s - x3) - 8 * yy * yy) % CURVE_P
+    return x3, y3, 2 * y * z % CURVE_P
+
+
+def _jacobian_add(p1, p2):
+    if p1 is None:
+        return p2
+    if p2 is None:
+        return p1
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+    
+    z1z1 = z1 * z1 % CURVE_P
+    z2z2 = z2 * z2 % CURVE_P
+    u1 = x1 * z2z2 % CURVE_P
+    u2 = x2 * z1z1 % CURVE_P
+    s1 = y1 * z2 * z2z2 % CURVE_P
+    s2 = y2 * z1 * z1z1 % CURVE_P
+    
+    if u1 == u2:
+        return _jacobian_double(p1) if s1 == s2 else None
+    
+    h = (u2 - u1) % CURVE_P
+    r = (s2 - s1) % CURVE_P
+    hh = h * h % CURVE_P
+    hhh = h * hh % CURVE_P
+    v = u1 * hh % CURVE_P
+    x3 = (r * r - hhh - 2 * v) % CURVE_P
+    y3 = (r * (v - x3) - s1 * hhh) % CURVE_P
+    return x3, y3, h * z1 * z2 % CURVE_P
+
+
+def _jacobian_negate(point):
+    return None if point is None else (point[0], -point[1] % CURVE_P, point[2])
+
+
+def _to_affine(point):
+    """Convert a Jacobian point to affine (x, y); None stays None"""
+    if point is None:
+        return None
+    x, y, z = point
+    z_inv = pow(z, -1, CURVE_P)
+    z_inv2 = z_inv * z_inv % CURVE_P
+    return x * z_inv2 % CURVE_P, y * z_inv2 * z_inv % CURVE_P
+
+
+def batch_inverse(values, modulus):
+    """Invert many values with one modular inversion (Montgomery's trick)"""
+    prefix = []
+    acc = 1
+    for value in values:
+        prefix.append(acc)
+        acc = acc * value % modulus
+    
+    inv = pow(acc, -1, modulus)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = prefix[i] * inv % modulus
+        inv = inv * values[i] % modulus
+    return result
+
+
+def batch_to_affine(points):
+    """Convert many Jacobian points to affine with a single inversion"""
+    z_invs = batch_inverse([point[2] for point in points], CURVE_P)
+    affine = []
+    for (x, y, _), z_inv in zip(points, z_invs):
+        z_inv2 = z_inv * z_inv % CURVE_P
+        affine.append((x * z_inv2 % CURVE_P, y * z_inv2 * z_inv % CURVE_P))
+    return affine
+
+
+def _build_generator_table():
+    digits = 1 << FIXED_BASE_WINDOW
+    rows = -(-CURVE_N.bit_length() // FIXED_BASE_WINDOW)
+    
+    points = []
+    base = GENERATOR
+    for _ in range(rows):
+        multiple = base
+        for _ in range(1, digits):
+            points.append(multiple)
+            multiple = _jacobian_add(multiple, base)
+        base = multiple  # 2^w * base
+    
+    packed = b"".join(x.to_bytes(COORD_BYTES, "big") + y.to_bytes(COORD_BYTES, "big") for x, y in batch_to_affine(points))
+    return np.frombuffer(packed, dtype=np.uint8)
+
+
+@lru_cache(maxsize=1)
+def generator_table():
+    """
+    Precomputed multiples of G for fixed-base multiplication
+    
+    Row i holds d * 2^(w*i) * G for every window digit d >= 1, as 64-byte
+    affine x || y, so k * G needs only additions and no doublings. The table
+    (about 0.5 MB) is a shared memory-mapped file, so all processes of a
+    user read one copy; it is checked against GENERATOR_TABLE_SHA256.
+    """
+    return memoryview(shared_table(f"p256_generator_w{FIXED_BASE_WINDOW}", _build_generator_table,
+                                   GENERATOR_TABLE_SHA256))
+
+
+def fixed_base_mult(scalar):
+    """Compute scalar * G (Jacobian) from the precomputed generator table"""
+    scalar %= CURVE_N
+    mask = (1 << FIXED_BASE_WINDOW) - 1
+    point_bytes = 2 * COORD_BYTES
+    table = generator_table()
+    
+    result = None
+    row = 0
+    while scalar:
+        if scalar & mask:
+            offset = row + ((scalar & mask) - 1) * point_bytes
+            point = (int.from_bytes(table[offset:offset + COORD_BYTES], "big"),
+                     int.from_bytes(table[offset + COORD_BYTES:offset + point_bytes], "big"), 1)
+            result = _jacobian_add(result, point)
+        scalar >>= FIXED_BASE_WINDOW
+        row += mask * point_bytes
+    return result
+
+
+def multi_scalar_mult(terms):
+    """
+    Compute sum(k * P) for (k, P) terms with Straus' interleaved windows
+    
+    All terms share the same chain of doublings, so N scalar multiplications
+    cost little more than one. Points are Jacobian tuples.
+    """
+    mask = (1 << MSM_WINDOW) - 1
+    tables = []
+    max_bits = 0
+    for scalar, point in terms:
+        scalar %= CURVE_N
+        if scalar == 0 or point is None:
+            continue
+        
+        # Multiples 0..2^w - 1 of the point
+        table = [None, point]
+        for _ in range(2, mask + 1):
+            table.append(_jacobian_add(table[-1], point))
+        tables.append((scalar, table))
+        max_bits = max(max_bits, scalar.bit_length())
+    
+    result = None
+    top = -(-max_bits // MSM_WINDOW) * MSM_WINDOW - MSM_WINDOW
+    for shift in range(top, -1, -MSM_WINDOW):
+        for _ in range(MSM_WINDOW):
+            result = _jacobian_double(result)
+        for scalar, table in tables:
+            digit = (scalar >> shift) & mask
+            if digit:
+                result = _jacobian_add(result, table[digit])
+    
+    return result
+
+
+class PythonBackend:
+    """Pure-Python curve arithmetic (Jacobian coordinates, no dependencies)"""
+    
+    name = "python"
+    
+    def base_mult(self, scalar):
+        """Return scalar * G as affine (x, y)"""
+        return _to_affine(fixed_base_mult(scalar))
+    
+    def base_mult_many(self, scalars):
+        """Return k * G for many scalars, normalized together"""
+        return batch_to_affine([fixed_base_mult(scalar) for scalar in scalars])
+    
+    def point_mult(self, scalar, point):
+        """Return scalar * point as affine (x, y)"""
+        return _to_affine(multi_scalar_mult([(scalar, (point[0], point[1], 1))]))
+
+
+class OpenSSLBackend:
+    """Curve arithmetic through OpenSSL, via the cryptography package"""
+    
+    name = "openssl"
+    
+    def __init__(self):
+        if ec is None:
+            raise ImportError("The openssl ECC backend needs the 'cryptography' package")
+        self.curve = ec.SECP256R1()
+    
+    def base_mult(self, scalar):
+        numbers = ec.derive_private_key(scalar, self.curve).public_key().public_numbers()
+        return numbers.x, numbers.y
+    
+    def base_mult_many(self, scalars):
+        return [self.base_mult(scalar) for scalar in scalars]
+    
+    def _ecdh_x(self, scalar, peer):
+        shared = ec.derive_private_key(scalar, self.curve).exchange(ec.ECDH(), peer)
+        return int.from_bytes(shared, "big")
+    
+    def point_mult(self, scalar, point):
+        # ECDH only exposes x of scalar * point. Of the two candidate ys, the
+        # right one is where adding point lands on x of (scalar + 1) * point.
+        if scalar in (1, CURVE_N - 1):
+            return point[0], point[1] if scalar == 1 else CURVE_P - point[1]
+        
+        peer = ec.EllipticCurvePublicNumbers(point[0], point[1], self.curve).public_key()
+        x = self._ecdh_x(scalar, peer)
+        y = pow((x * x * x + CURVE_A * x + CURVE_B) % CURVE_P, (CURVE_P + 1) // 4, CURVE_P)
+        
+        next_x = self._ecdh_x(scalar + 1, peer)
+        if _to_affine(_jacobian_add((x, y, 1), (point[0], point[1], 1)))[0] != next_x:
+            y = CURVE_P - y
+        return x, y
+
+
+BACKENDS = {"python": PythonBackend, "openssl": OpenSSLBackend}
+_backend = None
+
+
+def set_backend(name="auto"):
+    """Force the ECC backend ("python" or "openssl"), or pick one with "auto" """
+    global _backend
+    if name == "auto":
+        name = "openssl" if ec is not None else "python"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ECC backend: {name}")
+    
+    _backend = BACKENDS[name]()
+    return _backend
+
+
+def get_backend():
+    """Return the active ECC backend, selecting ECC_BACKEND on first use"""
+    if _backend is None:
+        set_backend(ECC_BACKEND)
+    return _backend
+
+
+class EphemeralKeyPool:
+    """
+    Bounded pool of precomputed ephemeral (scalar, k * G) pairs
+    
+    A background thread refills the pool whenever it drops below low_water,
+    so encryption and signing take their ephemeral point ready-made instead
+    of computing it on the request path. Each pair is handed out once. In a
+    forked child the inherited pairs are discarded (the parent may use them
+    too) and the filler restarts on the next take.
+    """
+    
+    def __init__(self, size, low_water=None):
+        self.size = size
+        self.low_water = max(1, size // 4 if low_water is None else min(low_water, size))
+        self._pairs = deque()
+        self._wanted = threading.Condition()
+        self._filler = None
+        self._stopped = False
+    
+    def _reset_after_fork(self):
+        self._pairs = deque()
+        self._wanted = threading.Condition()
+        self._filler = None
+    
+    def _fill(self):
+        refilling = True
+        while True:
+            with self._wanted:
+                # Sleep until the pool drops below the low-water mark, then top it up completely
+                while not self._stopped and not refilling:
+                    refilling = len(self._pairs) < self.low_water
+                    if not refilling:
+                        self._wanted.wait()
+                if self._stopped:
+                    return
+                missing = self.size - len(self._pairs)
+                if missing <= 0:
+                    refilling = False
+                    self._wanted.notify_all()
+                    continue
+            
+            # The multiplications run outside the lock
+            scalars = [secrets.randbelow(CURVE_N - 1) + 1 for _ in range(min(missing, KEYGEN_BATCH))]
+            pairs = list(zip(scalars, get_backend().base_mult_many(scalars)))
+            with self._wanted:
+                self._pairs.extend(pairs)
+    
+    def take(self, count=1):
+        """Up to count fresh pairs (fewer, possibly none, when the pool runs low)"""
+        with self._wanted:
+            if self._filler is None and not self._stopped:
+                self._filler = threading.Thread(target=self._fill, name="ecc-ephemeral-pool", daemon=True)
+                self._filler.start()
+            taken = [self._pairs.popleft() for _ in range(min(count, len(self._pairs)))]
+            if len(self._pairs) < self.low_water:
+                self._wanted.notify_all()
+        return taken
+    
+    def wait_full(self, timeout=None):
+        """Block until the pool is full (for warm-up and benchmarks); returns whether it is"""
+        self.take(0)
+        with self._wanted:
+            return self._wanted.wait_for(lambda: len(self._pairs) >= self.size, timeout)
+    
+    def stop(self):
+        """Stop the filler thread and drop the remaining pairs"""
+        with self._wanted:
+            self._stopped = True
+            self._pairs.clear()
+            self._wanted.notify_all()
+
+
+_ephemeral_pool = None
+
+
+def start_ephemeral_pool(size=None, low_water=None):
+    """
+    Serve ephemeral keys from a background-filled pool of size pairs
+    
+    Defaults come from ECC_EPHEMERAL_POOL and ECC_EPHEMERAL_LOW_WATER. The
+    filler thread only starts on first use, so this is safe to call before
+    forking workers.
+    """
+    global _ephemeral_pool
+    stop_ephemeral_pool()
+    size = EPHEMERAL_POOL_SIZE if size is None else size
+    if low_water is None and EPHEMERAL_LOW_WATER:
+        low_water = int(EPHEMERAL_LOW_WATER)
+    if size > 0:
+        _ephemeral_pool = EphemeralKeyPool(size, low_water)
+    return _ephemeral_pool
+
+
+def stop_ephemeral_pool():
+    """Go back to generating ephemeral keys inline"""
+    global _ephemeral_pool
+    if _ephemeral_pool is not None:
+        _ephemeral_pool.stop()
+        _ephemeral_pool = None
+
+
+def _reset_pool_after_fork():
+    if _ephemeral_pool is not None:
+        _ephemeral_pool._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def ephemeral_keys(count):
+    """
+    count fresh (scalar, (x, y)) ephemeral pairs with scalar in [1, n-1]
+    
+    Taken from the pool when one is running; whatever it can't supply is
+    generated inline.
+    """
+    pairs = _ephemeral_pool.take(count) if _ephemeral_pool is not None else []
+    if len(pairs) < count:
+        scalars = [secrets.randbelow(CURVE_N - 1) + 1 for _ in range(count - len(pairs))]
+        pairs.extend(zip(scalars, get_backend().base_mult_many(scalars)))
+    return pairs
+
+
+@lru_cache(maxsize=1024)
+def public_key_point(public_key_hex):
+    """Parse and validate a hex public key into a Jacobian point (cached)"""
+    point = point_from_hex(CURVE, public_key_hex)
+    x, y = point.x, point.y
+    if (y * y - x * x * x - CURVE_A * x - CURVE_B) % CURVE_P:
+        raise ValueError("Public key is not on the curve")
+    return x, y, 1
+
+
+def _message_scalar(message):
+    if isinstance(message, str):
+        message = message.encode('utf-8')
+    return int.from_bytes(hashlib.sha256(message).digest(), "big")
+
+
+def _split_signature(signature):
+    if len(signature) != SIGNATURE_BYTES:
+        raise ValueError("Invalid signature length")
+    return int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:64], "big"), signature[64] & 1
+
+
+def _recover_r_point(r, parity):
+    """Rebuild the signature nonce point R from r and the parity of its y"""
+    alpha = (r * r * r + CURVE_A * r + CURVE_B) % CURVE_P
+    y = pow(alpha, (CURVE_P + 1) // 4, CURVE_P)  # P-256 has p = 3 (mod 4)
+    if y * y % CURVE_P != alpha:
+        return None
+    if y & 1 != parity:
+        y = CURVE_P - y
+    return r, y, 1
+
+
+def sign_ecdsa(message, private_key_hex):
+    """
+    Sign a message with ECDSA (SHA-256, secp256r1)
+    
+    Returns 65 bytes: r || s || the parity of R.y. The extra byte lets a batch
+    verifier rebuild R; r and s alone are a standard ECDSA signature.
+    """
+    private_key = int(private_key_hex, 16)
+    z = _message_scalar(message)
+    
+    while True:
+        # The nonce point R = k * G comes from the ephemeral key pool when it runs
+        [(k, (x, y))] = ephemeral_keys(1)
+        
+        # Keep R recoverable from r (x >= n happens with probability ~2^-128)
+        if x >= CURVE_N:
+            continue
+        
+        r = x
+        s = pow(k, -1, CURVE_N) * (z + r * private_key) % CURVE_N
+        if r and s:
+            return r.to_bytes(32, "big") + s.to_bytes(32, "big") + bytes([y & 1])
+
+
+def verify_ecdsa(message, signature, public_key_hex):
+    """Verify one ECDSA signature made by sign_ecdsa"""
+    try:
+        r, s, _ = _split_signature(signature)
+        public_key = public_key_point(public_key_hex)
+    except ValueError:
+        return False
+    
+    if not (0 < r < CURVE_N and 0 < s < CURVE_N):
+        return False
+    
+    w = pow(s, -1, CURVE_N)
+    z = _message_scalar(message)
+    point = _to_affine(multi_scalar_mult([(z * w, GENERATOR), (r * w, public_key)]))
+    return point is not None and point[0] % CURVE_N == r
+
+
+def batch_verify_ecdsa(items):
+    """
+    Verify many (message, signature, public_key_hex) triples at once
+    
+    Checks sum(a_i * (u1_i*G + u2_i*Q_i - R_i)) == 0 for random 128-bit
+    weights a_i with a single multi-scalar multiplication. Returns True only
+    if every signature is valid (a forgery slips through with probability
+    about 2^-128). Use verify_ecdsa to find the bad ones when it fails.
+    """
+    parsed = []
+    for message, signature, public_key_hex in items:
+        try:
+            r, s, parity = _split_signature(signature)
+            public_key = public_key_point(public_key_hex)
+        except ValueError:
+            return False
+        
+        if not (0 < r < CURVE_N and 0 < s < CURVE_N):
+            return False
+        
+        nonce_point = _recover_r_point(r, parity)
+        if nonce_point is None:
+            return False
+        parsed.append((_message_scalar(message), r, s, public_key, nonce_point))
+    
+    if not parsed:
+        return True
+    
+    s_inverses = batch_inverse([s for _, _, s, _, _ in parsed], CURVE_N)
+    
+    # Coefficients of G and of each distinct public key are merged
+    generator_coeff = 0
+    key_coeffs = {}
+    terms = []
+    for (z, r, _, public_key, nonce_point), w in zip(parsed, s_inverses):
+        weight = secrets.randbits(BATCH_WEIGHT_BITS) | 1
+        generator_coeff += weight * z * w
+        key_coeffs[public_key] = key_coeffs.get(public_key, 0) + weight * r * w
+        terms.append((weight, _jacobian_negate(nonce_point)))
+    
+    terms.append((generator_coeff, GENERATOR))
+    terms.extend((coeff, public_key) for public_key, coeff in key_coeffs.items())
+    return multi_scalar_mult(terms) is None
+
+
 # Test the functions if executed directly
 if __name__ == "__main__":
     # Generate key pair
@@ -139,3 +758,24 @@ if __name__ == "__main__":
     print(f"Encrypted: {encrypted[:50]}...")  # Show only part of the encrypted data
     print(f"Decrypted: {decrypted}")
     assert message == decrypted, "Encryption/decryption test failed"
+    
+    # Test signing and batch verification
+    signatures = [(f"license {i}", sign_ecdsa(f"license {i}", private_key), public_key) for i in range(8)]
+    assert all(verify_ecdsa(*item) for item in signatures), "Signature test failed"
+    assert batch_verify_ecdsa(signatures), "Batch verification test failed"
+    
+    forged = signatures[:-1] + [("license 0", signatures[-1][1], public_key)]
+    assert not batch_verify_ecdsa(forged), "Batch verification accepted a forgery"
+    print("Signature tests passed")
+    
+    # Test bulk key generation against the single-key path
+    for private_key, public_key in generate_ecc_keypairs(KEYGEN_BATCH + 3):
+        assert PythonBackend().point_mult(int(private_key, 16), GENERATOR[:2]) == public_key_point(public_key)[:2], \
+            "Bulk key generation test failed"
+    print("Bulk key generation tests passed")
+    
+    # Test batched encryption
+    messages = [f"license {i}" for i in range(20)]
+    assert [decrypt_ecc(c, public_key) for c in encrypt_ecc_many(messages, private_key)] == messages, \
+        "Batched encryption test failed"
+    print("Batched encryption tests passed")
\ No newline at end of file
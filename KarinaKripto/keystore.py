@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+SQLite keystore for the Digital License System
+Maps short key ids to vendor/product public keys in a single indexed file, so
+a license carrying its key id is verified with one lookup instead of trying
+every key. Version 3 licenses carry only the first 4 bytes of the id and are
+looked up by prefix.
+"""
+
+import json
+import sqlite3
+import hashlib
+from functools import lru_cache
+
+from license_format import KEY_ID_BYTES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (
+    key_id BLOB PRIMARY KEY,
+    name TEXT,
+    public_key TEXT NOT NULL,
+    private_key TEXT
+)
+"""
+
+
+def key_id(public_key_hex):
+    """Short id of a public key: the start of the SHA-256 of its hex form"""
+    return hashlib.sha256(public_key_hex.lower().encode()).digest()[:KEY_ID_BYTES]
+
+
+@lru_cache(maxsize=None)
+def _connect(path):
+    """One shared connection per keystore file; ids stored at an older size are re-derived"""
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute(SCHEMA)
+    stale = db.execute("SELECT key_id, public_key FROM keys WHERE length(key_id) != ?", (KEY_ID_BYTES,)).fetchall()
+    if stale:
+        with db:
+            db.executemany("UPDATE keys SET key_id = ? WHERE key_id = ?",
+                           [(key_id(public_key), kid) for kid, public_key in stale])
+    return db
+
+
+def _store(db, rows):
+    """Insert (key id, name, public key, private key) rows, refusing key id collisions"""
+    seen = {}
+    for kid, _, public_key, _ in rows:
+        existing = seen.get(kid)
+        if existing is None:
+            row = db.execute("SELECT public_key FROM keys WHERE key_id = ?", (kid,)).fetchone()
+            existing = row and row[0]
+        if existing and existing != public_key:
+            raise ValueError(f"Key id collision for {kid.hex()}")
+        seen[kid] = public_key
+    db.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?)", rows)
+
+
+def add_key(path, public_key, private_key=None, name=None):
+    """Store a key (pair) and return its key id"""
+    kid = key_id(public_key)
+    db = _connect(path)
+    with db:
+        _store(db, [(kid, name, public_key, private_key)])
+    _cached_public_key.cache_clear()
+    return kid
+
+
+def import_keys(path, source):
+    """Import the key pairs of a keygen --count .jsonl file; returns the count"""
+    rows = []
+    with open(source, "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                name = entry.get("name") or (str(entry["index"]) if "index" in entry else None)
+                rows.append((key_id(entry["public_key"]), name, entry["public_key"], entry.get("private_key")))
+
+    db = _connect(path)
+    with db:
+        _store(db, rows)
+    _cached_public_key.cache_clear()
+    return len(rows)
+
+
+@lru_cache(maxsize=4096)
+def _cached_public_key(path, kid):
+    """
+    Public key hex for a key id or a shorter (version 3) prefix of one
+
+    Raises KeyError, which lru_cache doesn't keep, when no key matches, and
+    ValueError when a prefix matches several keys.
+    """
+    # Ids are fixed-size blobs, so every id starting with kid sorts between these two
+    low, high = kid.ljust(KEY_ID_BYTES, b"\0"), kid.ljust(KEY_ID_BYTES, b"\xff")
+    rows = _connect(path).execute("SELECT public_key FROM keys WHERE key_id BETWEEN ? AND ? LIMIT 2",
+                                  (low, high)).fetchall()
+    if not rows:
+        raise KeyError(kid.hex())
+    if len(rows) > 1:
+        raise ValueError(f"Key id {kid.hex()} matches several keys")
+    return rows[0][0]
+
+
+def lookup_public_key(path, kid):
+    """
+    Public key hex for a key id, or None when the keystore doesn't have it (yet)
+
+    Raises ValueError when a version 3 key id matches several keys.
+    """
+    try:
+        return _cached_public_key(path, bytes(kid))
+    except KeyError:
+        return None
+
+
+def list_keys(path):
+    """(key id hex, name) of every stored key"""
+    return [(kid.hex(), name) for kid, name in _connect(path).execute("SELECT key_id, name FROM keys ORDER BY name")]
+
+
+# Test the functions if executed directly
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from ecc_crypto import generate_ecc_keypair
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "keystore.db")
+        private_key, public_key = generate_ecc_keypair()
+        kid = add_key(path, public_key, private_key, name="test")
+
+        assert lookup_public_key(path, kid) == public_key, "Keystore lookup failed"
+        assert lookup_public_key(path, b"\0" * KEY_ID_BYTES) is None, "Keystore returned an unknown key"
+
+        # A key added by another process after a miss is found, and colliding imports are refused
+        other_private, other_public = generate_ecc_keypair()
+        other_kid = key_id(other_public)
+        assert lookup_public_key(path, other_kid) is None, "Keystore returned an unknown key"
+        _connect(path).execute("INSERT INTO keys VALUES (?, ?, ?, ?)", (other_kid, None, other_public, None))
+        assert lookup_public_key(path, other_kid) == other_public, "Keystore cached a miss"
+
+        source = os.path.join(workdir, "keys.jsonl")
+        with open(source, "w") as f:
+            f.write(json.dumps({"public_key": public_key.upper(), "private_key": other_private}) + "\n")
+        try:
+            import_keys(path, source)
+            raise AssertionError("Colliding import was accepted")
+        except ValueError:
+            pass
+        assert lookup_public_key(path, kid) == public_key, "Colliding import replaced a key"
+
+        # Version 3 licenses carry the first 4 bytes of the id
+        assert lookup_public_key(path, kid[:4]) == public_key, "Key id prefix lookup failed"
+        _connect(path).execute("INSERT INTO keys VALUES (?, ?, ?, ?)", (kid[:4] + b"\0" * 4, None, other_public, None))
+        _cached_public_key.cache_clear()
+        try:
+            lookup_public_key(path, kid[:4])
+            raise AssertionError("Ambiguous key id prefix was resolved")
+        except ValueError:
+            pass
+
+        # Keystores written with 4-byte ids are upgraded when opened
+        old_path = os.path.join(workdir, "old.db")
+        with sqlite3.connect(old_path) as db:
+            db.execute(SCHEMA)
+            db.execute("INSERT INTO keys VALUES (?, ?, ?, ?)", (kid[:4], "old", public_key, None))
+        assert lookup_public_key(old_path, kid) == public_key, "Old keystore was not upgraded"
+        print(f"Keystore test passed (key id {kid.hex()})")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Compact binary license encoding for the Digital License System
+Packs the license fields into a few dozen bytes instead of indented JSON, so
+far fewer bits have to be embedded in (and extracted from) the audio
+"""
+
+import struct
+from datetime import date
+
+# Version byte at the start of every binary license. It is below 0x20, so a
+# binary license can never be confused with Base64 or JSON text.
+# Version 2 carries an ECDSA signature, version 3 adds the issuer's key id
+# after the version byte and version 4 widens the key id from 4 to 8 bytes,
+# so the ids of a large keystore don't collide.
+LICENSE_VERSION = 4
+BINARY_VERSIONS = (2, 3, 4)
+KEY_ID_SIZES = {3: 4, 4: 8}
+KEY_ID_BYTES = KEY_ID_SIZES[LICENSE_VERSION]
+
+# Codes are positional: only ever append to these tuples
+LICENSE_TYPES = ("standard",)
+FEATURES = ("feature1", "feature2", "feature3")
+
+EPOCH = date(1970, 1, 1).toordinal()
+LICENSE_ID_BYTES = 8
+
+# issue day, expiry day, license id, type code, feature bitmap
+FIELDS_FORMAT = f">HH{LICENSE_ID_BYTES}sBI"
+
+
+def is_binary_license(data):
+    """Check whether data is a binary license (as opposed to text)"""
+    return isinstance(data, (bytes, bytearray)) and len(data) > 1 and data[0] in BINARY_VERSIONS
+
+
+def license_header(key_id):
+    """Plaintext header of a new binary license: version byte and key id"""
+    if len(key_id) != KEY_ID_BYTES:
+        raise ValueError(f"Key id must be {KEY_ID_BYTES} bytes")
+    return bytes([LICENSE_VERSION]) + key_id
+
+
+def header_length(data):
+    """Length of the plaintext header of a binary license"""
+    return 1 + KEY_ID_SIZES.get(data[0], 0)
+
+
+def license_key_id(data):
+    """Issuer key id of a binary license, or None for versions without one"""
+    if not is_binary_license(data) or data[0] not in KEY_ID_SIZES:
+        return None
+    return bytes(data[1:1 + KEY_ID_SIZES[data[0]]])
+
+
+def _pack_day(day_str):
+    days = date.fromisoformat(day_str).toordinal() - EPOCH
+    if not 0 <= days <= 0xFFFF:
+        raise ValueError(f"Date outside the binary license range ({_unpack_day(0)} to {_unpack_day(0xFFFF)}): {day_str}")
+    return days
+
+
+def _unpack_day(days):
+    return date.fromordinal(days + EPOCH).strftime("%Y-%m-%d")
+
+
+def _pack_text(text):
+    encoded = text.encode("utf-8")
+    if len(encoded) > 255:
+        raise ValueError(f"Field too long for a binary license: {text[:20]}...")
+    return struct.pack(">B", len(encoded)) + encoded
+
+
+def _unpack_text(data, offset):
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError("Truncated binary license")
+    return data[offset + 1:end].decode("utf-8"), end
+
+
+def pack_license(license_data):
+    """Pack a license dict into its binary fields
+
+    Raises ValueError for types or features the binary format can't express,
+    in which case the JSON format should be used instead.
+    """
+    if license_data["type"] not in LICENSE_TYPES:
+        raise ValueError(f"Unknown license type: {license_data['type']}")
+
+    bitmap = 0
+    for feature in license_data["features"]:
+        if feature not in FEATURES:
+            raise ValueError(f"Unknown license feature: {feature}")
+        bitmap |= 1 << FEATURES.index(feature)
+
+    license_id = bytes.fromhex(license_data["license_id"])
+    if len(license_id) != LICENSE_ID_BYTES:
+        raise ValueError("License id must be 8 bytes (16 hex characters)")
+
+    fields = struct.pack(
+        FIELDS_FORMAT,
+        _pack_day(license_data["issue_date"]),
+        _pack_day(license_data["expiry_date"]),
+        license_id,
+        LICENSE_TYPES.index(license_data["type"]),
+        bitmap,
+    )
+    customer = license_data["customer"]
+    return fields + _pack_text(customer["name"]) + _pack_text(customer["email"])
+
+
+def unpack_license(data):
+    """Unpack binary fields into the same dict shape as a JSON license"""
+    header_size = struct.calcsize(FIELDS_FORMAT)
+    if len(data) < header_size + 2:
+        raise ValueError("Truncated binary license")
+
+    issue_day, expiry_day, license_id, type_code, bitmap = struct.unpack_from(FIELDS_FORMAT, data)
+    name, offset = _unpack_text(data, header_size)
+    email, offset = _unpack_text(data, offset)
+
+    if type_code >= len(LICENSE_TYPES):
+        raise ValueError(f"Unknown license type code: {type_code}")
+
+    return {
+        "customer": {"name": name, "email": email},
+        "issue_date": _unpack_day(issue_day),
+        "expiry_date": _unpack_day(expiry_day),
+        "license_id": license_id.hex(),
+        "type": LICENSE_TYPES[type_code],
+        "features": [feature for i, feature in enumerate(FEATURES) if bitmap & (1 << i)],
+    }
+
+
+# Test the functions if executed directly
+if __name__ == "__main__":
+    import json
+
+    license_data = {
+        "customer": {"name": "Company Name", "email": "email@example.com"},
+        "issue_date": "2025-01-01",
+        "expiry_date": "2026-01-01",
+        "license_id": "0123456789abcdef",
+        "type": "standard",
+        "features": ["feature1", "feature3"],
+    }
+
+    packed = pack_license(license_data)
+    print(f"Binary: {len(packed)} bytes, JSON: {len(json.dumps(license_data, indent=2))} bytes")
+    assert unpack_license(packed) == license_data, "Binary license test failed"
+
+    try:
+        pack_license(dict(license_data, expiry_date="2200-01-01"))
+        raise AssertionError("Out-of-range date was packed")
+    except ValueError:
+        pass
+
+    # Version 3 headers keep their 4-byte key id
+    assert license_key_id(bytes([3]) + bytes(range(4)) + packed) == bytes(range(4)), "Version 3 key id misread"
+    assert license_key_id(license_header(bytes(range(8))) + packed) == bytes(range(8)), "Key id misread"
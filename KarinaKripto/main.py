@@ -19,12 +19,58 @@ from tinyec import registry
 import secrets
 
 # Local modules
-from ecc_crypto import encrypt_ecc, decrypt_ecc, generate_ecc_keypair
-from audio_stego import embed_data_in_audio, extract_data_from_audio
+from ecc_crypto import (encrypt_ecc, decrypt_ecc, encrypt_ecc_bytes, decrypt_ecc_bytes, generate_ecc_keypair,
+                        generate_ecc_keypairs, derive_public_key, sign_ecdsa, verify_ecdsa, batch_verify_ecdsa, set_backend, SIGNATURE_BYTES)
+from audio_stego import embed_bits_in_audio, restamp_bits_in_audio, extract_payload_from_audio, decode_text
+from framing import encode_frames, decode_frames
+from license_format import (is_binary_license, license_header, header_length, license_key_id,
+                            pack_license, unpack_license)
+from keystore import key_id, add_key, import_keys, lookup_public_key, list_keys
+from revocation import build_revocation_list, revoke, read_revoked_ids, open_revocation_list, is_revoked
+from registry import record_license, find_license, expiring_within, expiring_between, customer_licenses
 
 
-def generate_license(customer_info, private_key_file, output_file, expiry_days=365):
-    """Generate a digital license based on customer information"""
+def write_keypairs(count, output):
+    """
+    Generate count key pairs and stream them to a keystore
+    
+    A .jsonl output gets one JSON object per line; anything else is used as a
+    directory holding <n>_private_key.pem / <n>_public_key.pem files.
+    """
+    jsonl = output.endswith(".jsonl")
+    if jsonl:
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        out = open(output, "w")
+    else:
+        os.makedirs(output, exist_ok=True)
+    
+    width = len(str(count))
+    try:
+        for index, (private_key, public_key) in enumerate(generate_ecc_keypairs(count), 1):
+            if jsonl:
+                out.write(json.dumps({"index": index, "private_key": private_key, "public_key": public_key}) + "\n")
+                continue
+            
+            prefix = os.path.join(output, f"{index:0{width}d}_")
+            with open(prefix + "private_key.pem", "w") as f:
+                f.write(private_key)
+            with open(prefix + "public_key.pem", "w") as f:
+                f.write(public_key)
+    finally:
+        if jsonl:
+            out.close()
+    
+    print(f"{count} key pairs written to {output}")
+
+
+def generate_license(customer_info, private_key_file, output_file, expiry_days=365, compact=True, registry=None):
+    """Generate a digital license based on customer information
+    
+    compact selects the binary license format; otherwise the license is JSON.
+    The issued license is recorded in the registry file, if given.
+    """
     # Create license data
     issue_date = datetime.now()
     expiry_date = issue_date + timedelta(days=expiry_days)
@@ -38,26 +84,37 @@ def generate_license(customer_info, private_key_file, output_file, expiry_days=3
         "features": ["feature1", "feature2", "feature3"]
     }
     
-    # Convert to JSON string
-    license_json = json.dumps(license_data, indent=2)
-    
-    # Calculate SHA-256 hash
-    hash_obj = hashlib.sha256(license_json.encode())
-    license_hash = hash_obj.hexdigest()
-    
-    # Add hash to the license data
-    license_data["hash"] = license_hash
-    license_json = json.dumps(license_data, indent=2)
-    
-    print(f"Generated license data:")
-    print(license_json)
-    
     # Load private key
     with open(private_key_file, "r") as f:
         private_key = f.read().strip()
     
-    # Encrypt with ECC
-    encrypted_data = encrypt_ecc(license_json, private_key)
+    if compact:
+        # Pack, hash and encrypt the fields as a binary license
+        encrypted_data = encode_binary_license(license_data, private_key)
+        
+        print(f"Generated license data ({len(encrypted_data)} bytes binary):")
+        print(json.dumps(license_data, indent=2))
+    else:
+        # Convert to JSON string
+        license_json = json.dumps(license_data, indent=2)
+        
+        # Calculate SHA-256 hash
+        hash_obj = hashlib.sha256(license_json.encode())
+        license_hash = hash_obj.hexdigest()
+        
+        # Add hash to the license data
+        license_data["hash"] = license_hash
+        license_json = json.dumps(license_data, indent=2)
+        
+        # Sign the license (including its hash) and add the signature
+        license_data["signature"] = sign_ecdsa(license_json, private_key).hex()
+        license_json = json.dumps(license_data, indent=2)
+        
+        print(f"Generated license data:")
+        print(license_json)
+        
+        # Encrypt with ECC
+        encrypted_data = encrypt_ecc(license_json, private_key)
     
     # Encode to Base64
     base64_data = base64.b64encode(encrypted_data).decode("utf-8")
@@ -67,47 +124,57 @@ def generate_license(customer_info, private_key_file, output_file, expiry_days=3
         f.write(base64_data)
     
     print(f"License saved to {output_file}")
+    
+    if registry:
+        record_license(registry, license_data, base64_data, key_id(derive_public_key(private_key)).hex())
+        print(f"License {license_data['license_id']} recorded in {registry}")
     return base64_data
 
 
-def embed_license_in_audio(license_data, audio_input, audio_output):
-    """Embed license data into audio file using DCT steganography"""
-    return embed_data_in_audio(license_data, audio_input, audio_output)
+def encode_binary_license(license_data, private_key):
+    """Pack, encrypt and sign a license into the compact binary format"""
+    fields = pack_license(license_data)
+    header = license_header(key_id(derive_public_key(private_key)))
+    
+    # The signature covers the header (version and key id) and the plaintext fields
+    return header + encrypt_ecc_bytes(fields, private_key) + sign_ecdsa(header + fields, private_key)
 
 
-def extract_and_verify_license(audio_file, public_key_file):
-    """Extract license from audio file and verify it"""
-    # Extract data from audio
-    extracted_data = extract_data_from_audio(audio_file)
+def open_binary_license(license_bytes, public_key):
+    """
+    Decrypt a binary license
     
-    if not extracted_data:
-        print("Failed to extract license data from audio")
-        return None
+    Returns (license_data, signed_message, signature).
+    """
+    header = license_bytes[:header_length(license_bytes)]
+    fields = decrypt_ecc_bytes(license_bytes[len(header):-SIGNATURE_BYTES], public_key)
+    return unpack_license(fields), header + fields, license_bytes[-SIGNATURE_BYTES:]
+
+
+def open_json_license(license_text, public_key):
+    """
+    Decode, decrypt and parse a Base64 JSON license
     
+    Returns (license_data, signed_message, signature) like open_binary_license.
+    """
     # Decode from Base64
     try:
-        encrypted_data = base64.b64decode(extracted_data)
+        encrypted_data = base64.b64decode(license_text)
     except:
-        print("Error: Invalid Base64 data")
-        return None
-    
-    # Load public key
-    with open(public_key_file, "r") as f:
-        public_key = f.read().strip()
+        raise ValueError("Invalid Base64 data")
     
     # Decrypt with ECC
-    try:
-        decrypted_json = decrypt_ecc(encrypted_data, public_key)
-    except Exception as e:
-        print(f"Decryption error: {e}")
-        return None
+    decrypted_json = decrypt_ecc(encrypted_data, public_key)
     
     # Parse JSON
     try:
         license_data = json.loads(decrypted_json)
     except json.JSONDecodeError:
-        print("Error: Invalid JSON data")
-        return None
+        raise ValueError("Invalid JSON data")
+    
+    # The signature covers the license as it was before the signature was added
+    signature = license_data.pop("signature", None)
+    signed_message = json.dumps(license_data, indent=2)
     
     # Verify hash if present
     if "hash" in license_data:
@@ -120,7 +187,214 @@ def extract_and_verify_license(audio_file, public_key_file):
         else:
             print("License hash verified successfully")
     
-    # Check expiry date
+    if signature is None:
+        return license_data, None, None
+    return license_data, signed_message, bytes.fromhex(signature)
+
+
+def open_license(payload, public_key):
+    """Open an extracted license payload of either format, or None on error"""
+    try:
+        if is_binary_license(payload):
+            return open_binary_license(payload, public_key)
+        return open_json_license(payload, public_key)
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+
+def license_payload(license_text):
+    """Bytes to embed for a license file: raw bytes for binary licenses"""
+    license_text = license_text.strip()
+    try:
+        license_bytes = base64.b64decode(license_text, validate=True)
+    except ValueError:
+        license_bytes = b""
+    
+    if is_binary_license(license_bytes):
+        return license_bytes
+    
+    # JSON-era licenses are embedded as their Base64 text
+    return license_text.encode("utf-8")
+
+
+def embed_license_in_audio(license_data, audio_input, audio_output, verify=False):
+    """Embed license data into audio file using DCT steganography
+    
+    The license is wrapped in CRC-checked, error-correcting frames first.
+    With verify set, the frames are read back in memory before writing.
+    """
+    license_bits = encode_frames(license_payload(license_data))
+    return embed_bits_in_audio(license_bits, audio_input, audio_output, verify=verify)
+
+
+def restamp_license_in_audio(license_data, audio_file, verify=False):
+    """Replace the license embedded in a stamped WAV in place (e.g. after a renewal)"""
+    license_bits = encode_frames(license_payload(license_data))
+    return restamp_bits_in_audio(license_bits, audio_file, verify=verify)
+
+
+def decode_license_bits(bits):
+    """Decode embedded bits as a framed license, falling back to legacy text"""
+    try:
+        payload = decode_frames(bits)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    
+    if payload is None:
+        # Licenses embedded before framing are plain Base64 text
+        text = decode_text(bits)
+        return text.encode("utf-8") if text else None
+    
+    return payload
+
+
+def read_key_file(path):
+    """Read a hex key file"""
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def resolve_public_key(payload, public_key=None, keystore=None):
+    """
+    Pick the public key for a license payload
+    
+    With a keystore, the key id in the license header selects the key;
+    otherwise the given public key is used. Returns None if no key applies.
+    """
+    if keystore is None:
+        return public_key
+    
+    kid = license_key_id(payload)
+    if kid is None:
+        print("Error: License carries no key id; verify it with --public-key")
+        return None
+    
+    try:
+        public_key = lookup_public_key(keystore, kid)
+    except ValueError as e:
+        print(f"Error: {e}; verify the license with --public-key")
+        return None
+    if public_key is None:
+        print(f"Error: Key {kid.hex()} is not in the keystore")
+    return public_key
+
+
+def load_revocation_list(path):
+    """Open the revocation list at path up front; False (with an error) if it can't be read"""
+    try:
+        open_revocation_list(path)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read revocation list {path}: {e}")
+        return False
+    return True
+
+
+def extract_and_verify_license(audio_file, public_key_file=None, keystore=None, revoked=None, allow_unsigned=False):
+    """Extract license from audio file and verify it
+    
+    The key comes from public_key_file, or is looked up in keystore by the
+    key id carried in the license. Licenses on the revocation list at
+    revoked are rejected, and so are unsigned (JSON-era) licenses unless
+    allow_unsigned is set: the license key is public, so anyone could have
+    made them.
+    """
+    if revoked and not load_revocation_list(revoked):
+        return None
+    
+    # Extract data from audio
+    extracted_data = extract_payload_from_audio(audio_file, decode_license_bits)
+    
+    if not extracted_data:
+        print("Failed to extract license data from audio")
+        return None
+    
+    # Load public key
+    public_key = resolve_public_key(extracted_data, public_key_file and read_key_file(public_key_file), keystore)
+    if public_key is None:
+        return None
+    
+    opened = open_license(extracted_data, public_key)
+    if opened is None:
+        return None
+    
+    license_data, signed_message, signature = opened
+    
+    # Check the issuer's signature
+    if signature is None and not allow_unsigned:
+        print("Error: License is not signed (use --allow-unsigned to accept it anyway)")
+        return None
+    elif signature is None:
+        print("Warning: License is not signed")
+    elif not verify_ecdsa(signed_message, signature, public_key):
+        print("Error: License signature verification failed")
+        return None
+    else:
+        print("License signature verified successfully")
+    
+    if revoked and is_revoked(revoked, license_data.get("license_id", "")):
+        print(f"Error: License {license_data['license_id']} has been revoked")
+        return None
+    
+    check_expiry(license_data)
+    return license_data
+
+
+def verify_license_directory(directory, public_key_file=None, keystore=None, revoked=None):
+    """
+    Extract and verify the licenses of every WAV or FLAC file in a directory
+    
+    All signatures are checked together with one batch verification; files
+    are only checked one by one if the batch fails. Licenses on the
+    revocation list at revoked are reported as revoked. Returns a dict of
+    path -> license data (None for files without a valid license).
+    """
+    if revoked and not load_revocation_list(revoked):
+        return {}
+    
+    default_key = public_key_file and read_key_file(public_key_file)
+    
+    opened = {}
+    keys = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".wav", ".flac")):
+            continue
+        
+        path = os.path.join(directory, name)
+        payload = extract_payload_from_audio(path, decode_license_bits)
+        keys[path] = payload and resolve_public_key(payload, default_key, keystore)
+        opened[path] = open_license(payload, keys[path]) if keys[path] else None
+    
+    signed = [(path, result[1], result[2]) for path, result in opened.items() if result and result[2] is not None]
+    
+    if batch_verify_ecdsa([(message, signature, keys[path]) for path, message, signature in signed]):
+        valid = {path for path, _, _ in signed}
+    else:
+        valid = {path for path, message, signature in signed if verify_ecdsa(message, signature, keys[path])}
+    
+    results = {}
+    print("\nLicense audit:")
+    for path, result in opened.items():
+        if result is None:
+            status = "NO LICENSE"
+        elif result[2] is None:
+            status = "UNSIGNED"
+        elif path not in valid:
+            status = "INVALID SIGNATURE"
+        elif revoked and is_revoked(revoked, result[0].get("license_id", "")):
+            status = "REVOKED"
+        else:
+            status = "VALID"
+        
+        results[path] = result[0] if status == "VALID" else None
+        print(f"{status:<18} {path}")
+    
+    return results
+
+
+def check_expiry(license_data):
+    """Warn if the license has expired"""
     if "expiry_date" in license_data:
         try:
             expiry_date = datetime.strptime(license_data["expiry_date"], "%Y-%m-%d")
@@ -128,17 +402,18 @@ def extract_and_verify_license(audio_file, public_key_file):
                 print("Warning: License has expired")
         except:
             print("Warning: Invalid expiry date format")
-    
-    return license_data
 
 
 def main():
     parser = argparse.ArgumentParser(description="Digital License System with ECC & Audio Steganography")
+    parser.add_argument("--ecc-backend", choices=["auto", "python", "openssl"], default=None,
+                        help="ECC arithmetic backend (default: ECC_BACKEND or auto)")
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
     
     # Generate keypair
     keygen_parser = subparsers.add_parser("keygen", help="Generate ECC key pair")
-    keygen_parser.add_argument("--output", "-o", default="keys", help="Output directory for keys")
+    keygen_parser.add_argument("--output", "-o", default="keys", help="Output directory for keys (or .jsonl file with --count)")
+    keygen_parser.add_argument("--count", "-n", type=int, default=1, help="Number of key pairs to generate")
     
     # Generate license
     gen_parser = subparsers.add_parser("generate", help="Generate license")
@@ -147,21 +422,76 @@ def main():
     gen_parser.add_argument("--private-key", "-k", required=True, help="Private key file")
     gen_parser.add_argument("--output", "-o", default="license.dat", help="Output license file")
     gen_parser.add_argument("--days", "-d", type=int, default=365, help="License validity in days")
+    gen_parser.add_argument("--format", "-f", choices=["binary", "json"], default="binary", help="License encoding")
+    gen_parser.add_argument("--registry", "-r", help="Issuance registry to record the license in")
     
     # Embed license in audio
     embed_parser = subparsers.add_parser("embed", help="Embed license in audio")
     embed_parser.add_argument("--license", "-l", required=True, help="License file")
-    embed_parser.add_argument("--audio", "-a", required=True, help="Input audio file (WAV)")
-    embed_parser.add_argument("--output", "-o", required=True, help="Output audio file")
+    embed_parser.add_argument("--audio", "-a", required=True, help="Input audio file (WAV or FLAC)")
+    embed_parser.add_argument("--output", "-o", required=True, help="Output audio file (.flac for FLAC)")
+    embed_parser.add_argument("--verify", action="store_true",
+                              help="Check the embedded frames in memory before writing (no separate verify pass)")
+    
+    # Replace the license of a stamped file in place
+    restamp_parser = subparsers.add_parser("restamp", help="Replace the license of a stamped WAV in place")
+    restamp_parser.add_argument("--license", "-l", required=True, help="New license file")
+    restamp_parser.add_argument("--audio", "-a", required=True, help="Stamped audio file (mono WAV), modified in place")
+    restamp_parser.add_argument("--verify", action="store_true", help="Check the new frames in memory before writing")
     
     # Verify license
     verify_parser = subparsers.add_parser("verify", help="Verify license from audio")
     verify_parser.add_argument("--audio", "-a", required=True, help="Audio file with embedded license")
-    verify_parser.add_argument("--public-key", "-k", required=True, help="Public key file")
+    verify_key = verify_parser.add_mutually_exclusive_group(required=True)
+    verify_key.add_argument("--public-key", "-k", help="Public key file")
+    verify_key.add_argument("--keystore", "-K", help="Keystore to look the license's key id up in")
+    verify_parser.add_argument("--revoked", "-R", help="Revocation list to reject revoked licenses with")
+    verify_parser.add_argument("--allow-unsigned", action="store_true",
+                               help="Accept unsigned (JSON-era) licenses, which anyone with the public key can forge")
+    
+    # Verify every license in a directory
+    verify_dir_parser = subparsers.add_parser("verify-dir", help="Verify the licenses of all WAV and FLAC files in a directory")
+    verify_dir_parser.add_argument("--dir", "-D", required=True, help="Directory of audio files")
+    verify_dir_key = verify_dir_parser.add_mutually_exclusive_group(required=True)
+    verify_dir_key.add_argument("--public-key", "-k", help="Public key file")
+    verify_dir_key.add_argument("--keystore", "-K", help="Keystore to look each license's key id up in")
+    verify_dir_parser.add_argument("--revoked", "-R", help="Revocation list to report revoked licenses with")
+    
+    # Manage a keystore
+    keystore_parser = subparsers.add_parser("keystore", help="Add, import or list keystore keys")
+    keystore_parser.add_argument("action", choices=["add", "import", "list"], help="Keystore operation")
+    keystore_parser.add_argument("--db", "-K", required=True, help="Keystore file")
+    keystore_parser.add_argument("--public-key", "-k", help="Public key file to add")
+    keystore_parser.add_argument("--private-key", "-p", help="Private key file to store with it")
+    keystore_parser.add_argument("--name", "-N", help="Name of the added key")
+    keystore_parser.add_argument("--jsonl", "-j", help="keygen --count .jsonl file to import")
+    
+    # Manage a revocation list
+    revocation_parser = subparsers.add_parser("revocation", help="Revoke licenses, rebuild or list a revocation list")
+    revocation_parser.add_argument("action", choices=["add", "build", "list"], help="Revocation list operation")
+    revocation_parser.add_argument("--list", "-R", required=True, help="Revocation list (writes LIST.bloom and LIST.ids)")
+    revocation_parser.add_argument("--license-id", "-i", nargs="+", default=[], help="License ids to revoke")
+    revocation_parser.add_argument("--ids-file", "-f", help="File of license ids to revoke, one per line")
+    
+    # Query the issuance registry
+    query_parser = subparsers.add_parser("query", help="Look up issued licenses in the registry")
+    query_parser.add_argument("--registry", "-r", required=True, help="Issuance registry file")
+    query_by = query_parser.add_mutually_exclusive_group(required=True)
+    query_by.add_argument("--license-id", "-i", help="License id")
+    query_by.add_argument("--customer", "-e", help="Customer email")
+    query_by.add_argument("--expiring", "-d", type=int, help="Licenses expiring within this many days")
+    query_by.add_argument("--expires-before", "-b", help="Licenses expiring up to this date (YYYY-MM-DD)")
+    query_parser.add_argument("--limit", "-n", type=int, default=100, help="Maximum licenses listed (0 for all)")
     
     args = parser.parse_args()
     
-    if args.command == "keygen":
+    if args.ecc_backend:
+        set_backend(args.ecc_backend)
+    
+    if args.command == "keygen" and args.count > 1:
+        write_keypairs(args.count, args.output)
+    
+    elif args.command == "keygen":
         os.makedirs(args.output, exist_ok=True)
         private_key, public_key = generate_ecc_keypair()
         
@@ -178,20 +508,84 @@ def main():
             "name": args.customer,
             "email": args.email
         }
-        generate_license(customer_info, args.private_key, args.output, args.days)
+        try:
+            generate_license(customer_info, args.private_key, args.output, args.days, args.format == "binary",
+                             args.registry)
+        except (ValueError, OverflowError) as e:
+            print(f"Error: {e}")
     
     elif args.command == "embed":
         with open(args.license, "r") as f:
             license_data = f.read()
         
-        embed_license_in_audio(license_data, args.audio, args.output)
+        embed_license_in_audio(license_data, args.audio, args.output, args.verify)
+    
+    elif args.command == "restamp":
+        with open(args.license, "r") as f:
+            license_data = f.read()
+        
+        restamp_license_in_audio(license_data, args.audio, args.verify)
     
     elif args.command == "verify":
-        license_data = extract_and_verify_license(args.audio, args.public_key)
+        license_data = extract_and_verify_license(args.audio, args.public_key, args.keystore, args.revoked,
+                                                  args.allow_unsigned)
         if license_data:
             print("\nVerified License Information:")
             print(json.dumps(license_data, indent=2))
     
+    elif args.command == "verify-dir":
+        verify_license_directory(args.dir, args.public_key, args.keystore, args.revoked)
+    
+    elif args.command == "keystore":
+        try:
+            if args.action == "add":
+                if not args.public_key:
+                    parser.error("keystore add needs --public-key")
+                private_key = args.private_key and read_key_file(args.private_key)
+                kid = add_key(args.db, read_key_file(args.public_key), private_key, args.name)
+                print(f"Added key {kid.hex()} to {args.db}")
+            elif args.action == "import":
+                if not args.jsonl:
+                    parser.error("keystore import needs --jsonl")
+                print(f"Imported {import_keys(args.db, args.jsonl)} keys into {args.db}")
+            else:
+                for kid, name in list_keys(args.db):
+                    print(f"{kid}  {name or ''}")
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    elif args.command == "revocation":
+        license_ids = list(args.license_id)
+        if args.ids_file:
+            with open(args.ids_file, "r") as f:
+                license_ids += [line.strip() for line in f if line.strip()]
+        
+        if args.action == "add":
+            if not license_ids:
+                parser.error("revocation add needs --license-id or --ids-file")
+            print(f"Revoked {len(license_ids)} licenses, {revoke(args.list, license_ids)} on {args.list}")
+        elif args.action == "build":
+            print(f"Built {args.list} with {build_revocation_list(args.list, license_ids)} revoked licenses")
+        else:
+            for license_id in read_revoked_ids(args.list):
+                print(license_id)
+    
+    elif args.command == "query":
+        limit = args.limit or -1
+        if args.license_id:
+            found = find_license(args.registry, args.license_id)
+            licenses = [found] if found else []
+        elif args.customer:
+            licenses = customer_licenses(args.registry, args.customer, limit)
+        elif args.expiring is not None:
+            licenses = expiring_within(args.registry, args.expiring, limit)
+        else:
+            licenses = expiring_between(args.registry, "", args.expires_before, limit)
+        
+        for entry in licenses:
+            print(f"{entry['license_id']}  {entry['expiry_date']}  {entry['customer_email'] or '':<30} {entry['customer_name'] or ''}")
+        print(f"{len(licenses)} licenses")
+    
     else:
         parser.print_help()
 
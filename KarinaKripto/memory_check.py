@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for audio_stego embed/extract on long tracks
+Runs each operation in a fresh process on synthetic 1 minute+ tracks, reports
+traced allocations per stage and peak RSS, and fails when peak memory per
+second of audio exceeds the budget committed in memory_budget.json
+
+    python memory_check.py                      # 1, 10 and 30 minute tracks
+    python memory_check.py --minutes 60 120     # needs ~1 GB RAM per 10 minutes
+    python memory_check.py --write-budget       # record the current footprint
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+from scipy.io import wavfile
+
+from audio_stego import (read_audio, to_source_dtype, write_audio, tune_embedding, detect_format, decode_tuned,
+                         decode_text, embed_data_in_audio, extract_data_from_audio, string_to_bit_array,
+                         int_to_bits, SYNC_BITS)
+
+SAMPLE_RATE = 44100
+DEFAULT_MINUTES = (1, 10, 30)
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_budget.json")
+BUDGET_HEADROOM = 1.15  # --write-budget allows this much growth over the measured footprint
+RSS_INTERVAL = 0.005  # Seconds between RSS samples
+MB = 1024 * 1024
+
+
+def make_track(path, seconds, seed=0):
+    """Write a synthetic int16 noise track without a float copy of the whole signal"""
+    rng = np.random.default_rng(seed)
+    samples = np.empty(int(SAMPLE_RATE * seconds), dtype=np.int16)
+    for start in range(0, len(samples), SAMPLE_RATE * 60):
+        chunk = samples[start:start + SAMPLE_RATE * 60]
+        chunk[:] = np.clip(3000 * rng.standard_normal(len(chunk)), -32768, 32767)
+    wavfile.write(path, SAMPLE_RATE, samples)
+
+
+def rss_bytes():
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs: the peak so far is the best available figure
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def peak_rss(func, *args):
+    """Run func while sampling RSS in a thread; returns (result, peak RSS bytes)"""
+    peak = [rss_bytes()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(RSS_INTERVAL):
+            peak[0] = max(peak[0], rss_bytes())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        result = func(*args)
+    finally:
+        done.set()
+        sampler.join()
+    return result, max(peak[0], rss_bytes())
+
+
+def traced(stages, name, func, *args):
+    """Run one stage under tracemalloc, recording its peak and retained bytes"""
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = func(*args)
+    after, peak = tracemalloc.get_traced_memory()
+    stages.append({"stage": name, "peak": peak - before, "retained": after - before})
+    return result
+
+
+def embed_stages(input_path, output_path, payload):
+    """embed_data_in_audio broken into its stages"""
+    stages = []
+    sample_rate, audio_data, audio_float = traced(stages, "read", read_audio, input_path)
+    bits = string_to_bit_array(payload)
+    length_bits = int_to_bits(len(bits), 32)
+    stego_audio, _ = traced(stages, "tune + embed", tune_embedding,
+                            audio_float, audio_data.dtype, length_bits, SYNC_BITS + length_bits + bits)
+    stego_audio = traced(stages, "requantize", to_source_dtype, stego_audio, audio_data.dtype)
+    traced(stages, "write", write_audio, output_path, sample_rate, stego_audio)
+    return stages
+
+
+def extract_stages(path):
+    """extract_data_from_audio broken into its stages"""
+    stages = []
+    _, _, audio_float = traced(stages, "read", read_audio, path)
+    variant, data_length, steps = traced(stages, "detect", detect_format, audio_float)
+    traced(stages, "decode", decode_tuned, audio_float, (data_length, steps), decode_text)
+    return stages
+
+
+def run_operation(operation, input_path, output_path, payload):
+    """
+    Measure one operation in this (fresh) process
+
+    The end-to-end call is measured first, for peak RSS and traced peak, then
+    the same work stage by stage for the breakdown.
+    """
+    # Progress messages of the library would drown the report
+    sys.stdout = open(os.devnull, "w")
+    baseline = rss_bytes()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if operation == "embed":
+        ok, rss = peak_rss(embed_data_in_audio, payload, input_path, output_path)
+    else:
+        ok, rss = peak_rss(extract_data_from_audio, output_path)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.reset_peak()
+    stages = embed_stages(input_path, output_path, payload) if operation == "embed" else extract_stages(output_path)
+    tracemalloc.stop()
+
+    return {"ok": bool(ok), "seconds": elapsed, "traced_peak": traced_peak, "rss_peak": rss - baseline,
+            "stages": stages}
+
+
+def measure(operation, input_path, output_path, payload):
+    """Run one operation in a new process, so peak RSS isn't shared between runs"""
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_operation, operation, input_path, output_path, payload).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark for audio_stego on long tracks")
+    parser.add_argument("--minutes", type=float, nargs="+", default=DEFAULT_MINUTES, help="Track lengths to test")
+    parser.add_argument("--budget", default=BUDGET_PATH, help="Budget file (bytes per second of audio)")
+    parser.add_argument("--write-budget", action="store_true", help="Record the measured footprint as the budget")
+    args = parser.parse_args()
+
+    with open(args.budget, "r") as f:
+        budget = json.load(f)
+
+    payload = base64.b64encode(os.urandom(600)).decode()
+    measured = {}
+    failures = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for minutes in args.minutes:
+            seconds = minutes * 60
+            input_path = os.path.join(workdir, "input.wav")
+            output_path = os.path.join(workdir, "stego.wav")
+            make_track(input_path, seconds)
+            print(f"\n{minutes:g} minute track ({os.path.getsize(input_path) / MB:.0f} MB int16 mono)")
+            print(f"  {'operation':<10} {'stage':<14} {'peak MB':>9} {'kept MB':>9}")
+
+            for operation in ("embed", "extract"):
+                r = measure(operation, input_path, output_path, payload)
+                if not r["ok"]:
+                    failures.append(f"{operation} failed on the {minutes:g} minute track")
+                    continue
+
+                for stage in r["stages"]:
+                    print(f"  {operation:<10} {stage['stage']:<14} {stage['peak'] / MB:>9.1f} {stage['retained'] / MB:>9.1f}")
+                per_second = {"traced_bytes_per_second": r["traced_peak"] / seconds,
+                              "rss_bytes_per_second": r["rss_peak"] / seconds}
+                print(f"  {operation:<10} {'total':<14} {r['traced_peak'] / MB:>9.1f} {'':>9}   "
+                      f"RSS +{r['rss_peak'] / MB:.1f} MB, {r['seconds']:.2f} s, "
+                      f"{per_second['traced_bytes_per_second'] / 1024:.0f} KB traced and "
+                      f"{per_second['rss_bytes_per_second'] / 1024:.0f} KB RSS per second of audio")
+
+                # Short tracks are dominated by fixed costs; only long ones are held to the budget
+                if seconds < budget["min_seconds"]:
+                    continue
+                for key, value in per_second.items():
+                    measured[operation] = measured.get(operation, {})
+                    measured[operation][key] = max(measured[operation].get(key, 0), value)
+                    if value > budget[operation][key]:
+                        failures.append(f"{operation} on {minutes:g} minutes: {key} {value:.0f} "
+                                        f"exceeds the budget of {budget[operation][key]:.0f}")
+
+    if args.write_budget:
+        if not measured:
+            sys.exit(f"No track of at least {budget['min_seconds']} seconds was measured")
+        for operation, values in measured.items():
+            budget[operation] = {key: round(value * BUDGET_HEADROOM) for key, value in values.items()}
+        with open(args.budget, "w") as f:
+            json.dump(budget, f, indent=2)
+            f.write("\n")
+        print(f"\nBudget written to {args.budget}")
+        return
+
+    print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: peak memory per second of audio is within the budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Validation harness for the audio_stego working precision
+Embeds and extracts a payload through int16/int32/float32 WAV files with the
+float64 reference path and the float32 fast path, then reports bit accuracy,
+stamped-region SNR, speed and memory for each
+"""
+
+import os
+import sys
+import time
+import base64
+import tempfile
+import argparse
+import tracemalloc
+
+import numpy as np
+from scipy.io import wavfile
+
+import audio_stego
+from audio_stego import (embed_data_in_audio, extract_payload_bits, read_audio,
+                         string_to_bit_array)
+
+SAMPLE_RATE = 44100
+SOURCE_DTYPES = ("int16", "int32", "float32")
+PRECISIONS = ("float64", "float32")
+MIN_SNR_DB = 40  # Stamped blocks against the source, for every format
+
+
+def make_test_wav(path, source_dtype, seconds, seed=0):
+    """Write a synthetic tone-plus-noise WAV in the given sample format"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    signal = 0.25 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t))
+
+    if source_dtype == "float32":
+        samples = signal.astype(np.float32)
+    else:
+        info = np.iinfo(source_dtype)
+        samples = (signal * info.max).astype(source_dtype)
+
+    wavfile.write(path, SAMPLE_RATE, samples)
+
+
+def stamp_quality(input_path, output_path, block_count):
+    """SNR (dB) of the stamped blocks against the source, and the output's peak (full scale 1)"""
+    _, source = wavfile.read(input_path)
+    _, stego = wavfile.read(output_path)
+    scale = np.iinfo(source.dtype).max if source.dtype.kind == "i" else 1
+    stamped = slice(0, block_count * audio_stego.BLOCK_SIZE)
+    reference = source[stamped].astype(np.float64)
+    noise = stego[stamped].astype(np.float64) - reference
+    snr = 10 * np.log10(np.sum(reference ** 2) / max(np.sum(noise ** 2), 1e-30))
+    return snr, float(np.abs(stego).max()) / scale
+
+
+def measure(func, *args, **kwargs):
+    """Run func once, returning (result, seconds, peak traced bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def read_bits(path, bit_count, precision):
+    """Read the raw payload bits of a stego file at the given precision"""
+    _, _, audio_float = read_audio(path, precision)
+    return np.array(extract_payload_bits(audio_float, bit_count), dtype=np.uint8)
+
+
+def check_source(source_dtype, payload, workdir, seconds):
+    """Run both precisions over one source format and collect the results"""
+    input_path = os.path.join(workdir, f"input_{source_dtype}.wav")
+    make_test_wav(input_path, source_dtype, seconds)
+    payload_bits = np.array(string_to_bit_array(payload), dtype=np.uint8)
+
+    results = {}
+    for precision in PRECISIONS:
+        output_path = os.path.join(workdir, f"stego_{source_dtype}_{precision}.wav")
+        report, embed_time, embed_peak = measure(
+            embed_data_in_audio, payload, input_path, output_path, dtype=precision)
+        if not report:
+            raise RuntimeError(f"Embedding failed for {source_dtype} at {precision}")
+        snr, peak_sample = stamp_quality(input_path, output_path, len(report["steps"]))
+
+        bits, extract_time, extract_peak = measure(
+            read_bits, output_path, len(payload_bits), precision)
+
+        results[precision] = {
+            "path": output_path,
+            "bits": bits,
+            "bit_errors": int(np.count_nonzero(bits != payload_bits)),
+            "snr": snr,
+            "peak_sample": peak_sample,
+            "embed_time": embed_time,
+            "extract_time": extract_time,
+            "peak": max(embed_peak, extract_peak),
+        }
+
+    # The float32 reader must see exactly the bits the reference reader sees
+    reference_bits = read_bits(results["float64"]["path"], len(payload_bits), "float64")
+    fast_bits = read_bits(results["float64"]["path"], len(payload_bits), "float32")
+    results["reader_mismatches"] = int(np.count_nonzero(reference_bits != fast_bits))
+    results["payload_bits"] = len(payload_bits)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the float32 working precision of audio_stego")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Length of the synthetic test tracks")
+    parser.add_argument("--payload-bytes", type=int, default=600, help="Size of the random test payload")
+    args = parser.parse_args()
+
+    payload = base64.b64encode(os.urandom(args.payload_bytes)).decode()
+    failures = []
+
+    # Keep the per-call progress messages out of the report
+    quiet = open(os.devnull, "w")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'source':<8} {'precision':<9} {'bit errors':>10} {'SNR dB':>7} {'embed s':>8} {'extract s':>9} "
+              f"{'peak MB':>8}")
+        for source_dtype in SOURCE_DTYPES:
+            stdout, sys.stdout = sys.stdout, quiet
+            try:
+                results = check_source(source_dtype, payload, workdir, args.seconds)
+            finally:
+                sys.stdout = stdout
+
+            for precision in PRECISIONS:
+                r = results[precision]
+                print(f"{source_dtype:<8} {precision:<9} {r['bit_errors']:>10} {r['snr']:>7.1f} "
+                      f"{r['embed_time']:>8.3f} {r['extract_time']:>9.3f} {r['peak'] / 1e6:>8.1f}")
+
+            ref, fast = results["float64"], results["float32"]
+            speedup = (ref["embed_time"] + ref["extract_time"]) / (fast["embed_time"] + fast["extract_time"])
+            print(f"{'':<8} float32 speedup {speedup:.2f}x, peak memory {fast['peak'] / ref['peak']:.0%} of float64")
+
+            for precision in PRECISIONS:
+                r = results[precision]
+                if r["snr"] < MIN_SNR_DB:
+                    failures.append(f"{source_dtype}: {precision} path stamps at {r['snr']:.1f} dB SNR (< {MIN_SNR_DB} dB)")
+                if r["peak_sample"] > 1:
+                    failures.append(f"{source_dtype}: {precision} path writes samples up to {r['peak_sample']:.3f} of full scale")
+
+            if ref["bit_errors"]:
+                # Strength tuning must make every source format round-trip
+                failures.append(f"{source_dtype}: reference path loses {ref['bit_errors']} bits on requantization")
+                continue
+            if results["reader_mismatches"]:
+                failures.append(f"{source_dtype}: float32 reader disagrees on {results['reader_mismatches']} bits")
+            if fast["bit_errors"]:
+                failures.append(f"{source_dtype}: float32 path adds {fast['bit_errors']} bit errors")
+
+    quiet.close()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: float32 matches the float64 reference (ALPHA = {audio_stego.ALPHA})")
+
+
+if __name__ == "__main__":
+    main()
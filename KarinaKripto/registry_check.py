@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the issuance registry
+Records a million synthetic licenses with batched transactions, then times
+the license id, expiry and customer queries and checks that each one is
+answered from an index rather than a table scan
+
+    python registry_check.py                    # 1M licenses
+    python registry_check.py --rows 5000000
+"""
+
+import os
+import sys
+import time
+import secrets
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+import registry
+from registry import record_licenses, find_license, expiring_within, customer_licenses
+
+DEFAULT_ROWS = 1_000_000
+CUSTOMERS = 50_000
+QUERY_REPEATS = 20
+MAX_QUERY_MS = 50  # Slowest acceptable average query time
+QUERY_LIMIT = 100  # Rows listed per query, as in the query subcommand
+
+
+def synthetic_licenses(rows):
+    """(license, text, key id) tuples spread over 3 years of expiry dates"""
+    today = date.today()
+    for i in range(rows):
+        yield ({"license_id": secrets.token_hex(8),
+                "customer": {"name": f"Customer {i % CUSTOMERS}", "email": f"customer{i % CUSTOMERS}@example.com"},
+                "issue_date": today.isoformat(),
+                "expiry_date": (today + timedelta(days=i % 1095)).isoformat(),
+                "type": "standard", "features": ["feature1"]}, None, None)
+
+
+def time_query(func, *args):
+    """Average milliseconds per call and the last result"""
+    start = time.perf_counter()
+    for _ in range(QUERY_REPEATS):
+        result = func(*args)
+    return (time.perf_counter() - start) / QUERY_REPEATS * 1000, result
+
+
+def uses_index(path, sql, params):
+    """True if SQLite answers sql from an index"""
+    plan = " ".join(row[3] for row in registry._connect(path).execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    return "USING" in plan and "INDEX" in plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the issuance registry")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Licenses to record")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "registry.db")
+        start = time.perf_counter()
+        record_licenses(path, synthetic_licenses(args.rows))
+        seconds = time.perf_counter() - start
+        print(f"Recorded {args.rows} licenses in {seconds:.1f} s ({args.rows / seconds:.0f}/s), "
+              f"{os.path.getsize(path) / args.rows:.0f} bytes per license")
+
+        known_id = registry._connect(path).execute("SELECT license_id FROM licenses LIMIT 1").fetchone()[0]
+        queries = [
+            ("license id", find_license, (path, known_id),
+             "SELECT * FROM licenses WHERE license_id = ?", (known_id,)),
+            ("expiring in 7 days", expiring_within, (path, 7, QUERY_LIMIT),
+             "SELECT * FROM licenses WHERE expiry_date BETWEEN ? AND ? ORDER BY expiry_date LIMIT ?", ("", "", -1)),
+            ("customer", customer_licenses, (path, "customer42@example.com", QUERY_LIMIT),
+             "SELECT * FROM licenses WHERE customer_email = ? ORDER BY expiry_date LIMIT ?", ("", -1)),
+        ]
+
+        print(f"\n{'query':<20} {'ms':>8} {'rows':>8}")
+        for name, func, func_args, sql, params in queries:
+            ms, result = time_query(func, *func_args)
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            print(f"{name:<20} {ms:>8.2f} {rows:>8}")
+            if not uses_index(path, sql, params):
+                failures.append(f"{name} query scans the table")
+            if ms > MAX_QUERY_MS:
+                failures.append(f"{name} query took {ms:.1f} ms (limit {MAX_QUERY_MS} ms)")
+
+    print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: every query is answered from an index")
+
+
+if __name__ == "__main__":
+    main()
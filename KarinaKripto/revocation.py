@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+License revocation list for the Digital License System
+Revoked license ids are kept in two memory-mapped files: a Bloom filter
+(<list>.bloom) that rules out almost every valid license with a few bit
+reads, and the exact sorted ids (<list>.ids) that confirm a filter hit with a
+binary search. Both are shared by all processes through the page cache and
+reloaded automatically when they are replaced.
+"""
+
+import os
+import mmap
+import time
+import struct
+import hashlib
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+BLOOM_MAGIC = b"RVBF"
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct("<4sHHQQ")  # magic, version, hash count, bit count, id count
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+RELOAD_INTERVAL = 1.0  # Seconds between checks for replaced files
+ID_DTYPE = np.dtype("<u8")  # License ids are 8 bytes
+
+
+def license_id_value(license_id):
+    """License id (hex string) as an integer"""
+    if len(license_id) > 2 * ID_DTYPE.itemsize:
+        raise ValueError(f"License id too long: {license_id}")
+    return int(license_id, 16)
+
+
+def _hashes(value):
+    """The two base hashes of an id for double hashing"""
+    digest = hashlib.blake2b(value.to_bytes(ID_DTYPE.itemsize, "little"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+def _publish(path, data):
+    """Atomically replace path with data, so readers see the old or the new file"""
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def build_revocation_list(path, license_ids, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+    """Write the Bloom filter and sorted id files of a revocation list; returns the id count"""
+    ids = np.unique(np.array([license_id_value(license_id) for license_id in license_ids], dtype=np.uint64))
+
+    # Optimal size and hash count for the target false positive rate
+    count = max(len(ids), 1)
+    bit_count = max(64, int(np.ceil(-count * np.log(false_positive_rate) / np.log(2) ** 2)))
+    hash_count = max(1, round(bit_count / count * np.log(2)))
+
+    hashes = np.array([_hashes(int(value)) for value in ids], dtype=np.uint64).reshape(-1, 2)
+    rounds = np.arange(hash_count, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        positions = (hashes[:, :1] + rounds * hashes[:, 1:]) % np.uint64(bit_count)
+    bits = np.zeros((bit_count + 7) // 8, dtype=np.uint8)
+    np.bitwise_or.at(bits, (positions >> np.uint64(3)).ravel(), (1 << (positions & np.uint64(7))).astype(np.uint8).ravel())
+
+    # The exact ids go first, so a reader never sees filter entries it can't confirm for long
+    _publish(f"{path}.ids", ids.astype(ID_DTYPE).tobytes())
+    _publish(f"{path}.bloom", BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, hash_count, bit_count, len(ids)) + bits.tobytes())
+    open_revocation_list.cache_clear()
+    return len(ids)
+
+
+def read_revoked_ids(path):
+    """Every revoked license id (hex) of a list, or [] if it doesn't exist yet"""
+    try:
+        with open(f"{path}.ids", "rb") as f:
+            return [f"{value:016x}" for value in np.frombuffer(f.read(), dtype=ID_DTYPE)]
+    except FileNotFoundError:
+        return []
+
+
+def revoke(path, license_ids):
+    """Add license ids to a revocation list (creating it if needed); returns the new id count"""
+    return build_revocation_list(path, read_revoked_ids(path) + list(license_ids))
+
+
+def _map(path):
+    """Read-only memory map of a file (None for an empty one)"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class RevocationList:
+    """
+    Memory-mapped revocation list with hot reload
+
+    Lookups check at most once per RELOAD_INTERVAL whether the files were
+    replaced, and map the new ones if so.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked = 0
+        self._load()
+
+    def _file_signature(self):
+        signature = []
+        for suffix in (".bloom", ".ids"):
+            stat = os.stat(f"{self.path}{suffix}")
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self):
+        signature = self._file_signature()
+        bloom = _map(f"{self.path}.bloom")
+        magic, version, hash_count, bit_count, count = BLOOM_HEADER.unpack_from(bloom)
+        if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+            raise ValueError(f"Not a revocation filter: {self.path}.bloom")
+
+        ids = _map(f"{self.path}.ids")
+        self._bloom, self._hash_count, self._bit_count = bloom, hash_count, bit_count
+        self._ids = np.frombuffer(ids, dtype=ID_DTYPE) if ids else np.zeros(0, dtype=ID_DTYPE)
+        self._signature = signature
+        self.count = count
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                if self._file_signature() != self._signature:
+                    self._load()
+            except (OSError, ValueError) as e:
+                # Keep serving the last good list while a writer replaces the files
+                print(f"Warning: could not reload revocation list {self.path}: {e}")
+
+    def might_be_revoked(self, value):
+        """Bloom filter check: False means certainly not revoked"""
+        h1, h2 = _hashes(value)
+        for i in range(self._hash_count):
+            position = (h1 + i * h2) % (1 << 64) % self._bit_count
+            if not self._bloom[BLOOM_HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def is_revoked(self, license_id):
+        """True if license_id (hex) is on the list"""
+        self._reload_if_changed()
+        try:
+            value = license_id_value(license_id)
+        except ValueError:
+            return False
+        if not self.might_be_revoked(value):
+            return False
+
+        ids = self._ids
+        index = np.searchsorted(ids, np.uint64(value))
+        return bool(index < len(ids) and ids[index] == value)
+
+
+@lru_cache(maxsize=None)
+def open_revocation_list(path):
+    """The shared RevocationList of a list path"""
+    return RevocationList(path)
+
+
+def is_revoked(path, license_id):
+    """True if license_id is on the revocation list at path"""
+    return open_revocation_list(path).is_revoked(license_id)
+
+
+# Test the functions if executed directly
+if __name__ == "__main__":
+    import secrets
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "revoked")
+        revoked = [secrets.token_hex(8) for _ in range(1000)]
+        build_revocation_list(path, revoked)
+
+        assert all(is_revoked(path, license_id) for license_id in revoked), "Revoked id not found"
+        assert not any(is_revoked(path, secrets.token_hex(8)) for _ in range(1000)), "Valid id reported revoked"
+
+        extra = secrets.token_hex(8)
+        revoke(path, [extra])
+        assert is_revoked(path, extra) and is_revoked(path, revoked[0]), "Revoke did not extend the list"
+        print(f"Revocation list test passed ({len(read_revoked_ids(path))} ids)")
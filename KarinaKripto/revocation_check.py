@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark for revocation list lookups
+Builds revocation lists of random license ids, checks that every revoked id
+is found and no valid one is, and reports build time, size per id, lookup
+rate and the Bloom filter's false positive rate next to an in-memory set
+
+    python revocation_check.py                  # 100k and 1M revoked ids
+    python revocation_check.py --ids 10000000
+"""
+
+import os
+import sys
+import time
+import secrets
+import argparse
+import tempfile
+import tracemalloc
+
+from revocation import build_revocation_list, RevocationList, license_id_value
+
+DEFAULT_IDS = (100_000, 1_000_000)
+LOOKUPS = 100_000
+MB = 1024 * 1024
+
+
+def lookup_rate(func, license_ids):
+    """Lookups per second of func over license_ids, and how many returned True"""
+    start = time.perf_counter()
+    hits = sum(1 for license_id in license_ids if func(license_id))
+    return len(license_ids) / (time.perf_counter() - start), hits
+
+
+def set_footprint(license_ids):
+    """Bytes a per-worker Python set of the ids would hold"""
+    tracemalloc.start()
+    revoked = set(license_ids)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return revoked, size
+
+
+def check(count, lookups, workdir):
+    """Build one list of count ids and measure it; returns a list of failures"""
+    revoked_ids = [secrets.token_hex(8) for _ in range(count)]
+    valid_ids = [secrets.token_hex(8) for _ in range(lookups)]
+    sample = revoked_ids[:lookups]
+    path = os.path.join(workdir, f"revoked{count}")
+
+    start = time.perf_counter()
+    build_revocation_list(path, revoked_ids)
+    build_seconds = time.perf_counter() - start
+    file_bytes = os.path.getsize(f"{path}.bloom") + os.path.getsize(f"{path}.ids")
+
+    revocations = RevocationList(path)
+    valid_rate, valid_hits = lookup_rate(revocations.is_revoked, valid_ids)
+    revoked_rate, revoked_hits = lookup_rate(revocations.is_revoked, sample)
+    filter_hits = sum(1 for license_id in valid_ids if revocations.might_be_revoked(license_id_value(license_id)))
+
+    revoked_set, set_bytes = set_footprint(revoked_ids)
+    set_rate, _ = lookup_rate(revoked_set.__contains__, valid_ids)
+
+    print(f"\n{count} revoked ids: built in {build_seconds:.2f} s, {file_bytes / MB:.1f} MB on disk "
+          f"({file_bytes / count:.1f} bytes per id), Python set {set_bytes / MB:.1f} MB per worker "
+          f"({set_bytes / count:.0f} bytes per id)")
+    print(f"  valid id lookups   {valid_rate:>10.0f}/s   (Python set {set_rate:.0f}/s)")
+    print(f"  revoked id lookups {revoked_rate:>10.0f}/s")
+    print(f"  filter false positives {filter_hits}/{len(valid_ids)} ({filter_hits / len(valid_ids):.3%})")
+
+    failures = []
+    if valid_hits:
+        failures.append(f"{count} ids: {valid_hits} valid ids reported revoked")
+    if revoked_hits != len(sample):
+        failures.append(f"{count} ids: {len(sample) - revoked_hits} revoked ids not found")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark revocation list lookups")
+    parser.add_argument("--ids", type=int, nargs="+", default=DEFAULT_IDS, help="Revocation list sizes to test")
+    parser.add_argument("--lookups", type=int, default=LOOKUPS, help="Lookups measured per list")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in args.ids:
+            failures += check(count, min(args.lookups, count), workdir)
+
+    print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: every revoked id found, no valid id rejected")
+
+
+if __name__ == "__main__":
+    main()